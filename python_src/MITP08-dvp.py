@@ -1,73 +1,82 @@
 import numpy as np
 from netCDF4 import Dataset
 
+from tomotools.checkpoint import ResumableOutput
+from tomotools.manifest import OutputVerifier
+
 # 输入文件路径
 input_filename = '../orig_nc/MITP08_dvp.nc'
 # 输出文件路径
 output_filename = '../processing_nc/MITP08-dvp.nc'
+# 每个检查点包含的深度层数（每块写完即落盘，中断后重新运行从最后完成的块继续）
+depth_block = 16
 
 # ---------------------------- 读取原始文件并转换 ----------------------------
-with Dataset(input_filename, mode='r') as src:
-    # 创建新文件
-    with Dataset(output_filename, mode='w') as dst:
-        
+# 写入时同步校验输出（坐标单调性、数值范围、NaN/填充值计数、分块校验和），结果保存为 manifest
+verifier = OutputVerifier(output_filename)
+
+# 先写入 .part 临时文件，全部深度块完成后原子重命名为最终文件
+with Dataset(input_filename, mode='r') as src, \
+        ResumableOutput(output_filename, [input_filename], verifier) as out:
+    dst = out.dataset
+
+    # 经度从 [0,360] 转换为 [-180,180] 的排序索引，先算好后直接按新顺序写入（不再回读输出重排）
+    sort_idx = None
+    if 'longitude' in src.variables:
+        lon_data = src.variables['longitude'][:]
+        lon_converted = ((lon_data + 180) % 360) - 180
+        sort_idx = np.argsort(lon_converted)
+
+    v_var = src.variables['v']
+
+    # 创建新文件（断点续算时已存在，跳过）
+    if out.fresh:
+
         # 复制维度
         for dimname, dim in src.dimensions.items():
             dst.createDimension(dimname, len(dim) if not dim.isunlimited() else None)
-        
+
         # 复制所有变量，除了要重命名的 'v' 变量
         for varname, variable in src.variables.items():
             if varname == 'v':
                 continue  # 跳过原始变量
-            
+
             # 创建新变量并复制数据和属性
             out_var = dst.createVariable(varname, variable.datatype, variable.dimensions)
-            out_var[:] = variable[:]
-            
+            if varname == 'longitude':
+                verifier.write(out_var, lon_converted[sort_idx])
+            else:
+                verifier.write(out_var, variable[:])
+
             # 复制所有属性
             for attr_name in variable.ncattrs():
                 setattr(out_var, attr_name, getattr(variable, attr_name))
-        
-        # 特别处理 'v' 变量，重命名为 'dVp(%)'
-        v_var = src.variables['v']
+
+        # 特别处理 'v' 变量，重命名为 'dVp(%)'，数据在下面按深度分块写入
         dvp_var = dst.createVariable('dVp(%)', v_var.datatype, v_var.dimensions)
-        dvp_var[:] = v_var[:]
-        
+
         # 设置 'dVp(%)' 变量的标准元数据
         dvp_var.units = '%, relative to ak135'
         dvp_var.long_name = 'dVp(%)'
         dvp_var.coordinates = "depth latitude longitude"
         dvp_var.standard_name = 'compressional_velocity_perturbation_relative_to_depth_mean_percentage'
         dvp_var.description = 'Perturbation of compressional wave speed from depth-average reference model, expressed as percentage.'
-        
+
         # 复制 'v' 变量的其他属性（如果有的话）
         for attr_name in v_var.ncattrs():
             if attr_name not in ['units', 'long_name', 'coordinates', 'standard_name', 'description']:
                 setattr(dvp_var, attr_name, getattr(v_var, attr_name))
-        
-        # 特别处理经度变量，将其从 [0,360] 转换为 [-180,180]
+
+        # 特别处理经度变量，数值已按 [-180,180] 排序写入，这里只补充元数据
         if 'longitude' in dst.variables:
             lon_var = dst.variables['longitude']
-            lon_data = lon_var[:]
-            # 转换经度范围
-            lon_converted = ((lon_data + 180) % 360) - 180
-            # 重新排序经度和对应的数据维度
-            sort_idx = np.argsort(lon_converted)
-            lon_var[:] = lon_converted[sort_idx]
-            
+
             # 添加标准的经度元数据
             lon_var.units = 'degrees_east'
             lon_var.long_name = 'longitude'
             lon_var.standard_name = 'longitude'
             lon_var.axis = 'X'
-            
-            # 如果存在 'dVp(%)' 变量，也需要对其经度维度重新排序
-            if 'dVp(%)' in dst.variables:
-                dvp_data = dst.variables['dVp(%)'][:]
-                # 假设经度是最后一个维度
-                dvp_sorted = dvp_data[..., sort_idx]
-                dst.variables['dVp(%)'][:] = dvp_sorted
-        
+
         # 处理纬度变量，添加标准元数据
         if 'latitude' in dst.variables:
             lat_var = dst.variables['latitude']
@@ -76,7 +85,7 @@ with Dataset(input_filename, mode='r') as src:
             lat_var.long_name = 'latitude'
             lat_var.standard_name = 'latitude'
             lat_var.axis = 'Y'
-        
+
         # 处理深度变量，添加标准元数据
         if 'depth' in dst.variables:
             depth_var = dst.variables['depth']
@@ -87,4 +96,17 @@ with Dataset(input_filename, mode='r') as src:
             depth_var.axis = 'Z'
             depth_var.positive = 'down'
 
+        out.ready()
+
+    # 按深度分块写入 'dVp(%)'（深度是第一个维度），每块完成后记录检查点
+    dvp_var = dst.variables['dVp(%)']
+    for k0, k1 in out.pending_blocks(v_var.shape[0], depth_block):
+        dvp_data = v_var[k0:k1]
+        if sort_idx is not None:
+            # 经度维度同步重排，假设经度是最后一个维度
+            dvp_data = dvp_data[..., sort_idx]
+        verifier.write_block(dvp_var, k0, dvp_data)
+        out.done(k0, k1)
+
+verifier.finish()
 print(f"✅ 成功生成新文件 '{output_filename}'，变量 'v' 已重命名为 'dVp(%)'，经度已转换为 [-180, 180]，并添加了完整元数据")
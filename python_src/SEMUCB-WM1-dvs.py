@@ -1,50 +1,61 @@
 import numpy as np
 from netCDF4 import Dataset
 
+from tomotools.checkpoint import ResumableOutput
+from tomotools.manifest import OutputVerifier
+
 # 输入文件路径
 input_filename = '../orig_nc/SEMUCB-WM1_dvs.nc'
 # 输出文件路径
 output_filename = '../processing_nc/SEMUCB-WM1-dvs.nc'
+# 每个检查点包含的深度层数（每块写完即落盘，中断后重新运行从最后完成的块继续）
+depth_block = 16
 
 # ---------------------------- 读取原始文件并转换 ----------------------------
-with Dataset(input_filename, mode='r') as src:
-    # 创建新文件
-    with Dataset(output_filename, mode='w') as dst:
-        
+# 写入时同步校验输出（坐标单调性、数值范围、NaN/填充值计数、分块校验和），结果保存为 manifest
+verifier = OutputVerifier(output_filename)
+
+# 先写入 .part 临时文件，全部深度块完成后原子重命名为最终文件
+with Dataset(input_filename, mode='r') as src, \
+        ResumableOutput(output_filename, [input_filename], verifier) as out:
+    dst = out.dataset
+    dvs_var = src.variables['v']
+
+    # 创建新文件（断点续算时已存在，跳过）
+    if out.fresh:
+
         # 复制维度
         for dimname, dim in src.dimensions.items():
             dst.createDimension(dimname, len(dim) if not dim.isunlimited() else None)
-        
+
         # 复制所有变量，除了要重命名的 'dvs' 变量
         for varname, variable in src.variables.items():
             if varname == 'v':
                 continue  # 跳过原始变量
-            
+
             # 创建新变量并复制数据和属性
             out_var = dst.createVariable(varname, variable.datatype, variable.dimensions)
-            out_var[:] = variable[:]
-            
+            verifier.write(out_var, variable[:])
+
             # 复制所有属性
             for attr_name in variable.ncattrs():
                 setattr(out_var, attr_name, getattr(variable, attr_name))
-        
-        # 特别处理 'dvs' 变量，重命名为 'dVs(%)'
-        dvs_var = src.variables['v']
+
+        # 特别处理 'dvs' 变量，重命名为 'dVs(%)'，数据在下面按深度分块写入
         dvs_pct_var = dst.createVariable('dVs(%)', dvs_var.datatype, dvs_var.dimensions)
-        dvs_pct_var[:] = dvs_var[:]
-        
+
         # 设置 'dVs(%)' 变量的标准元数据
         dvs_pct_var.units = '%, relative to the Voigt-averge of the given 1D reference model'
         dvs_pct_var.long_name = 'dVs(%)'
         dvs_pct_var.coordinates = "depth latitude longitude"
         dvs_pct_var.standard_name = 'shear_velocity_perturbation_relative_to_depth_mean_percentage'
         dvs_pct_var.description = 'Perturbation of shear wave speed from depth-average reference model, expressed as percentage.'
-        
+
         # 复制 'dvs' 变量的其他属性（如果有的话）
         for attr_name in dvs_var.ncattrs():
             if attr_name not in ['units', 'long_name', 'coordinates', 'standard_name', 'description']:
                 setattr(dvs_pct_var, attr_name, getattr(dvs_var, attr_name))
-        
+
         # 处理坐标变量，添加标准元数据
         # 经度变量
         if 'longitude' in dst.variables:
@@ -54,7 +65,7 @@ with Dataset(input_filename, mode='r') as src:
             lon_var.long_name = 'longitude'
             lon_var.standard_name = 'longitude'
             lon_var.axis = 'X'
-        
+
         # 纬度变量
         if 'latitude' in dst.variables:
             lat_var = dst.variables['latitude']
@@ -63,7 +74,7 @@ with Dataset(input_filename, mode='r') as src:
             lat_var.long_name = 'latitude'
             lat_var.standard_name = 'latitude'
             lat_var.axis = 'Y'
-        
+
         # 深度变量
         if 'depth' in dst.variables:
             depth_var = dst.variables['depth']
@@ -74,4 +85,13 @@ with Dataset(input_filename, mode='r') as src:
             depth_var.axis = 'Z'
             depth_var.positive = 'down'
 
+        out.ready()
+
+    # 按深度分块写入 'dVs(%)'（深度是第一个维度），每块完成后记录检查点
+    dvs_pct_var = dst.variables['dVs(%)']
+    for k0, k1 in out.pending_blocks(dvs_var.shape[0], depth_block):
+        verifier.write_block(dvs_pct_var, k0, dvs_var[k0:k1])
+        out.done(k0, k1)
+
+verifier.finish()
 print(f"✅ 成功生成新文件 '{output_filename}'，变量 'v' 已重命名为 'dVs(%)'，并添加了完整元数据")
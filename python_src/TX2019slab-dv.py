@@ -1,77 +1,83 @@
 import numpy as np
 from netCDF4 import Dataset
 
+from tomotools.checkpoint import ResumableOutput
+from tomotools.manifest import OutputVerifier
+
 # 输入文件路径
 input_filename = '../orig_nc/TX2019slab_percent.nc'
 # 输出文件路径
 output_filename = '../processing_nc/TX2019slab-dv.nc'
+# 每个检查点包含的深度层数（每块写完即落盘，中断后重新运行从最后完成的块继续）
+depth_block = 16
 
 # ---------------------------- 读取原始文件并转换 ----------------------------
-with Dataset(input_filename, mode='r') as src:
-    # 创建新文件
-    with Dataset(output_filename, mode='w') as dst:
-        
+# 写入时同步校验输出（坐标单调性、数值范围、NaN/填充值计数、分块校验和），结果保存为 manifest
+verifier = OutputVerifier(output_filename)
+
+# 先写入 .part 临时文件，全部深度块完成后原子重命名为最终文件
+with Dataset(input_filename, mode='r') as src, \
+        ResumableOutput(output_filename, [input_filename], verifier) as out:
+    dst = out.dataset
+
+    # 需要重命名并按深度分块写入的变量：原变量名 -> 新变量名
+    renamed = {name: new_name for name, new_name in [('dvs', 'dVs(%)'), ('dvp', 'dVp(%)')]
+               if name in src.variables}
+
+    # 创建新文件（断点续算时已存在，跳过）
+    if out.fresh:
+
         # 复制维度
         for dimname, dim in src.dimensions.items():
             dst.createDimension(dimname, len(dim) if not dim.isunlimited() else None)
-        
+
         # 复制所有变量，除了要重命名的 'dvs' 和 'dvp' 变量
         for varname, variable in src.variables.items():
             if varname in ['dvs', 'dvp']:
                 continue  # 跳过需要重命名的变量
-            
+
             # 检查是否有 _FillValue 属性
             fill_value = getattr(variable, '_FillValue', None)
-            
+
             # 创建新变量并复制数据和属性
             if fill_value is not None:
                 out_var = dst.createVariable(varname, variable.datatype, variable.dimensions, fill_value=fill_value)
             else:
                 out_var = dst.createVariable(varname, variable.datatype, variable.dimensions)
-            
-            out_var[:] = variable[:]
-            
+
+            verifier.write(out_var, variable[:])
+
             # 复制除 _FillValue 之外的所有属性
             for attr_name in variable.ncattrs():
                 if attr_name != '_FillValue':
                     setattr(out_var, attr_name, getattr(variable, attr_name))
-        
-        # 特别处理 'dvs' 变量，重命名为 'dVs(%)'
-        if 'dvs' in src.variables:
-            dvs_var = src.variables['dvs']
-            # 检查是否有 _FillValue 属性
-            fill_value = getattr(dvs_var, '_FillValue', None)
-            
-            # 创建新变量
-            if fill_value is not None:
-                dvs_pct_var = dst.createVariable('dVs(%)', dvs_var.datatype, dvs_var.dimensions, fill_value=fill_value)
-            else:
-                dvs_pct_var = dst.createVariable('dVs(%)', dvs_var.datatype, dvs_var.dimensions)
-            
-            dvs_pct_var[:] = dvs_var[:]
-            
-            # 复制除 _FillValue 之外的所有属性
-            for attr_name in dvs_var.ncattrs():
-                if attr_name != '_FillValue':
-                    setattr(dvs_pct_var, attr_name, getattr(dvs_var, attr_name))
-        
-        # 特别处理 'dvp' 变量，重命名为 'dVp(%)'
-        if 'dvp' in src.variables:
-            dvp_var = src.variables['dvp']
+
+        # 特别处理 'dvs' 和 'dvp' 变量，重命名为 'dVs(%)' 和 'dVp(%)'，数据在下面按深度分块写入
+        for name, new_name in renamed.items():
+            variable = src.variables[name]
             # 检查是否有 _FillValue 属性
-            fill_value = getattr(dvp_var, '_FillValue', None)
-            
+            fill_value = getattr(variable, '_FillValue', None)
+
             # 创建新变量
             if fill_value is not None:
-                dvp_pct_var = dst.createVariable('dVp(%)', dvp_var.datatype, dvp_var.dimensions, fill_value=fill_value)
+                pct_var = dst.createVariable(new_name, variable.datatype, variable.dimensions, fill_value=fill_value)
             else:
-                dvp_pct_var = dst.createVariable('dVp(%)', dvp_var.datatype, dvp_var.dimensions)
-            
-            dvp_pct_var[:] = dvp_var[:]
-            
+                pct_var = dst.createVariable(new_name, variable.datatype, variable.dimensions)
+
             # 复制除 _FillValue 之外的所有属性
-            for attr_name in dvp_var.ncattrs():
+            for attr_name in variable.ncattrs():
                 if attr_name != '_FillValue':
-                    setattr(dvp_pct_var, attr_name, getattr(dvp_var, attr_name))
+                    setattr(pct_var, attr_name, getattr(variable, attr_name))
+
+        out.ready()
+
+    # 按深度分块写入 'dVs(%)' 和 'dVp(%)'（深度是第一个维度），每块完成后记录检查点
+    if renamed:
+        ndepth = src.variables[next(iter(renamed))].shape[0]
+        for k0, k1 in out.pending_blocks(ndepth, depth_block):
+            for name, new_name in renamed.items():
+                verifier.write_block(dst.variables[new_name], k0, src.variables[name][k0:k1])
+            out.done(k0, k1)
 
+verifier.finish()
 print(f"✅ 成功生成新文件 '{output_filename}'，变量 'dvs' 和 'dvp' 已重命名为 'dVs(%)' 和 'dVp(%)'")
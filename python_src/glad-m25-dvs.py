@@ -1,80 +1,120 @@
 import numpy as np
 from netCDF4 import Dataset
 
+from tomotools.checkpoint import ResumableOutput
+from tomotools.manifest import OutputVerifier
+from tomotools.reductions import depth_mean, fill_to_nan, layer_weights
+
 # 输入文件路径
 input_filename = '../orig_nc/glad-m25-vs-0.0-n4.nc'
 # 输出文件路径
 output_filename = '../processing_nc/glad-m25-dvs.nc'
+# 每个检查点包含的深度层数（每块算完即落盘，中断后重新运行从最后完成的块继续）
+depth_block = 4
+# 每层深度均值的计算方式：'unweighted' 各网格点等权（与原结果一致），'area' 按纬度带面积（约 cos(纬度)）加权
+mean_mode = 'unweighted'
 
 # ---------------------------- 1. 读取原始文件中的变量和维度 ----------------------------
-# ---------------------------- 2. 计算 vs 和 dlnVs(%) ----------------------------
-# ---------------------------- 3. 创建新文件并只写入必要变量 ----------------------------
-with Dataset(input_filename, mode='r') as src:
+# ---------------------------- 2. 创建新文件并只写入必要变量 ----------------------------
+# ---------------------------- 3. 按深度分块计算 vs 和 dlnVs(%) ----------------------------
+# 写入时同步校验输出（坐标单调性、数值范围、NaN/填充值计数、分块校验和），结果保存为 manifest
+verifier = OutputVerifier(output_filename)
+
+# 先写入 .part 临时文件，全部深度块完成后原子重命名为最终文件
+with Dataset(input_filename, mode='r') as src, \
+        ResumableOutput(output_filename, [input_filename], verifier,
+                        settings={'mean_mode': mean_mode}) as out:
     depth = src.variables['depth'][:]
     latitude = src.variables['latitude'][:]
     longitude = src.variables['longitude'][:]
 
-    vsv = src.variables['vsv'][:]
-    vsh = src.variables['vsh'][:]
-
-    # ---------------------------- 2. 计算 vs 和 dlnVs(%) ----------------------------
-    # 原始 shape: (depth, lon, lat)，先进行转置为 (depth, lat, lon)
-    vsv = np.transpose(vsv, (0, 2, 1))
-    vsh = np.transpose(vsh, (0, 2, 1))
-
-    # 计算各向平均的 Vs
-    vs = np.sqrt((2 * vsv**2 + vsh**2) / 3)
-
-    # 每层深度对经纬度求均值：shape (depth,)
-    vs_mean = np.mean(vs, axis=(1, 2), keepdims=True)  # shape: (depth, 1, 1)
+    # 均值的纬度权重（unweighted 时为 None），以及按 (0, 2, 1) 转置后纬度所在的轴
+    lat_weights = layer_weights(latitude, mean_mode)
+    lat_axis = (0, 2, 1).index(src.variables['vsv'].dimensions.index('latitude'))
+    if mean_mode == 'unweighted':
+        dv_units = '%, dV relative to depth-averaged velocity'
+    else:
+        dv_units = '%, dV relative to area-weighted depth-averaged velocity'
 
-    # 计算相对扰动百分比 dlnVs (%)
-    dlnVs_pct = (vs - vs_mean) / vs_mean * 100  # 单位是 %
+    # ---------------------------- 2. 创建新文件并只写入必要变量 ----------------------------
+    dst = out.dataset
+    if out.fresh:
 
-    # ---------------------------- 3. 创建新文件并只写入必要变量 ----------------------------
-    with Dataset(output_filename, mode='w') as dst:
-        
         # 创建维度
         dst.createDimension('depth', len(depth))
         dst.createDimension('latitude', len(latitude))
         dst.createDimension('longitude', len(longitude))
-        
+
         # 复制坐标变量及其属性
         # depth
         var_depth = dst.createVariable('depth', np.float32, ('depth',))
-        var_depth[:] = depth
+        verifier.write(var_depth, depth)
         if 'depth' in src.variables:
             for attr in src.variables['depth'].ncattrs():
                 setattr(var_depth, attr, getattr(src.variables['depth'], attr))
-        
+
         # latitude
         var_latitude = dst.createVariable('latitude', np.float32, ('latitude',))
-        var_latitude[:] = latitude
+        verifier.write(var_latitude, latitude)
         if 'latitude' in src.variables:
             for attr in src.variables['latitude'].ncattrs():
                 setattr(var_latitude, attr, getattr(src.variables['latitude'], attr))
-        
+
         # longitude
         var_longitude = dst.createVariable('longitude', np.float32, ('longitude',))
-        var_longitude[:] = longitude
+        verifier.write(var_longitude, longitude)
         if 'longitude' in src.variables:
             for attr in src.variables['longitude'].ncattrs():
                 setattr(var_longitude, attr, getattr(src.variables['longitude'], attr))
-        
-        # 写入计算后的 Vs
+
+        # 计算后的 Vs
         var_vs = dst.createVariable('vs', np.float32, ('depth', 'latitude', 'longitude'))
-        var_vs[:] = np.transpose(vs, (0, 2, 1))  # 还原成原始维度结构 (depth, lon, lat)
         var_vs.units = 'km/s'
         var_vs.long_name = 'Shear wave velocity'
         var_vs.coordinates = "depth latitude longitude"
-        
-        # 写入 dlnVs(%)
+
+        # dlnVs(%)
         var_dlnVs_pct = dst.createVariable('dVs(%)', np.float32, ('depth', 'latitude', 'longitude'))
-        var_dlnVs_pct[:] = np.transpose(dlnVs_pct, (0, 2, 1))  # 还原成原始维度结构 (depth, lon, lat)
-        var_dlnVs_pct.units = '%, dV relative to depth-averaged velocity'
+        var_dlnVs_pct.units = dv_units
         var_dlnVs_pct.long_name = 'dVs(%)'
         var_dlnVs_pct.coordinates = "depth latitude longitude"
         var_dlnVs_pct.standard_name = 'shear_velocity_perturbation_relative_to_depth_mean_percentage'
         var_dlnVs_pct.description = 'Perturbation of shear wave speed from depth-average reference model, expressed as percentage.'
 
+        out.ready()
+
+    var_vs = dst.variables['vs']
+    var_dlnVs_pct = dst.variables['dVs(%)']
+
+    # ---------------------------- 3. 按深度分块计算 vs 和 dlnVs(%) ----------------------------
+    for k0, k1 in out.pending_blocks(len(depth), depth_block):
+        # 只读当前深度块
+        vsv = fill_to_nan(src.variables['vsv'][k0:k1])
+        vsh = fill_to_nan(src.variables['vsh'][k0:k1])
+
+        # 输入填充值的位置（原始维度结构）
+        vs_fill = np.isnan(vsv) | np.isnan(vsh)
+
+        # 原始 shape: (depth, lon, lat)，先进行转置为 (depth, lat, lon)
+        vsv = np.transpose(vsv, (0, 2, 1))
+        vsh = np.transpose(vsh, (0, 2, 1))
+
+        # 计算各向平均的 Vs
+        vs = np.sqrt((2 * vsv**2 + vsh**2) / 3)
+
+        # 每层深度对经纬度求均值（跳过 NaN；逐层独立，分块计算与整体计算结果一致）
+        vs_mean = depth_mean(vs, lat_weights, lat_axis)[:, None, None]  # shape: (depth, 1, 1)
+
+        # 计算相对扰动百分比 dlnVs (%)
+        dlnVs_pct = (vs - vs_mean) / vs_mean * 100  # 单位是 %
+
+        # 写入当前深度块，还原成原始维度结构 (depth, lon, lat)；只有输入为填充值的位置写回为填充值，
+        # 计算产生的 NaN 原样写入，由校验器报告
+        verifier.write_block(var_vs, k0, np.ma.masked_array(np.transpose(vs, (0, 2, 1)), mask=vs_fill))
+        verifier.write_block(var_dlnVs_pct, k0, np.ma.masked_array(np.transpose(dlnVs_pct, (0, 2, 1)), mask=vs_fill))
+
+        # 记录检查点
+        out.done(k0, k1)
+
+verifier.finish()
 print("✅ 已成功创建精简文件 'glad-m25-dvs.nc'，只包含 vs 和 dVs(%)")
@@ -0,0 +1,47 @@
+"""
+Shared fixtures: small synthetic models written with the same layout as the
+processing_nc files, so the tests need none of the LFS model files.
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def write_model(path, depth, lat, lon, values=None, name='dVs(%)', absolute=None,
+                dimensions=('depth', 'latitude', 'longitude'), fill_value=-9999.0):
+    """
+    Write a (depth, latitude, longitude) model; `values` is a callable of the
+    broadcast (depth, lat, lon) coordinates (NaN becomes a fill value).
+    `absolute` optionally adds a constant 'vs' variable.
+    """
+    axes = {'depth': np.asarray(depth, dtype=np.float64),
+            'latitude': np.asarray(lat, dtype=np.float64),
+            'longitude': np.asarray(lon, dtype=np.float64)}
+    coords = np.meshgrid(*(axes[dim] for dim in dimensions), indexing='ij')
+    coords = dict(zip(dimensions, coords))
+    if values is None:
+        values = lambda depth, lat, lon: depth / 1000 + np.cos(np.radians(lat)) * np.sin(np.radians(lon))
+    data = values(coords['depth'], coords['latitude'], coords['longitude'])
+
+    with Dataset(path, mode='w') as ds:
+        for dim in ('depth', 'latitude', 'longitude'):
+            ds.createDimension(dim, axes[dim].size)
+            ds.createVariable(dim, np.float32, (dim,))[:] = axes[dim]
+        var = ds.createVariable(name, np.float32, dimensions, fill_value=fill_value)
+        var[:] = np.ma.masked_invalid(np.asarray(data, dtype=np.float64))
+        if absolute is not None:
+            ds.createVariable('vs', np.float32, dimensions)[:] = np.full(data.shape, absolute)
+    return Path(path)
+
+
+@pytest.fixture
+def make_model(tmp_path):
+    """write_model into the test's temporary directory"""
+    def make(filename, *args, **kwargs):
+        return write_model(tmp_path / filename, *args, **kwargs)
+    return make
@@ -0,0 +1,199 @@
+"""
+Resume and verification behaviour of a real conversion script (glad-m35-dv.py)
+run on a small synthetic input in a temporary processing tree.
+"""
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from tomotools.checkpoint import ResumableOutput
+from tomotools.manifest import OutputVerifier, check_manifest
+
+PYTHON_SRC = Path(__file__).resolve().parents[1]
+SCRIPT = 'glad-m35-dv.py'
+INPUT = 'GLAD-M35.r0.1-n4.nc'
+OUTPUT = 'glad-m35-dv.nc'
+NDEPTH = 10     # depth blocks of 4: (0, 4), (4, 8), (8, 10)
+WRITES = 4      # 3-D write_block calls per depth block
+
+# Runs the script and SIGKILLs it on the n-th 3-D write_block call (0: never)
+RUNNER = """
+import os, runpy, signal, sys
+from tomotools.manifest import OutputVerifier
+kill_at, calls = int(sys.argv[1]), [0]
+write_block = OutputVerifier.write_block
+def killing(self, variable, start, data):
+    if variable.ndim == 3:
+        calls[0] += 1
+        if calls[0] == kill_at:
+            os.kill(os.getpid(), signal.SIGKILL)
+    return write_block(self, variable, start, data)
+OutputVerifier.write_block = killing
+runpy.run_path(sys.argv[2], run_name='__main__')
+"""
+
+
+def write_input(path, inf_at=None):
+    """GLAD-like (depth, longitude, latitude) vsv/vsh/vpv/vph with a polar fill cap"""
+    depth = np.linspace(25, 2850, NDEPTH)
+    lat = np.arange(-90, 90.1, 10.0)
+    lon = np.arange(-180, 180, 10.0)
+    d, lo, la = np.meshgrid(depth, lon, lat, indexing='ij')
+    wave = np.cos(np.radians(la)) * np.sin(np.radians(2 * lo))
+    with Dataset(path, mode='w') as ds:
+        for name, values in (('depth', depth), ('longitude', lon), ('latitude', lat)):
+            ds.createDimension(name, values.size)
+            ds.createVariable(name, np.float32, (name,))[:] = values
+        for name, mean in (('vsv', 4.4), ('vsh', 4.5), ('vpv', 8.0), ('vph', 8.1)):
+            var = ds.createVariable(name, np.float32, ('depth', 'longitude', 'latitude'), fill_value=-9999.0)
+            data = np.ma.masked_array(mean + d / 1000 + 0.1 * wave, mask=la > 80)
+            if inf_at is not None and name == 'vsv':
+                data[inf_at] = np.inf
+            var[:] = data
+
+
+def make_tree(root):
+    """Copy of the script with orig_nc/ and processing_nc/ next to it"""
+    for name in ('python_src', 'orig_nc', 'processing_nc'):
+        (root / name).mkdir()
+    shutil.copy(PYTHON_SRC / SCRIPT, root / 'python_src')
+    write_input(root / 'orig_nc' / INPUT)
+    return root
+
+
+@pytest.fixture
+def tree(tmp_path):
+    return make_tree(tmp_path)
+
+
+def run(tree, kill_at=0):
+    env = dict(os.environ, PYTHONPATH=str(PYTHON_SRC))
+    return subprocess.run([sys.executable, '-c', RUNNER, str(kill_at), SCRIPT], cwd=tree / 'python_src',
+                          env=env, capture_output=True, text=True)
+
+
+def read_output(path):
+    with Dataset(path) as ds:
+        return {name: ds.variables[name][:] for name in ds.variables}
+
+
+def assert_same_output(a, b):
+    a, b = read_output(a), read_output(b)
+    assert a.keys() == b.keys()
+    for name in a:
+        np.testing.assert_array_equal(np.ma.getmaskarray(a[name]), np.ma.getmaskarray(b[name]))
+        np.testing.assert_array_equal(a[name].filled(0), b[name].filled(0))
+
+
+@pytest.fixture
+def reference(tmp_path_factory):
+    """Output of an uninterrupted run"""
+    root = make_tree(tmp_path_factory.mktemp('reference'))
+    assert run(root).returncode == 0
+    return root / 'processing_nc' / OUTPUT
+
+
+def test_resume_after_kill_mid_block(tree, reference):
+    output = tree / 'processing_nc' / OUTPUT
+    # Killed after the first variable of the third depth block was written
+    killed = run(tree, kill_at=2 * WRITES + 2)
+    assert killed.returncode == -9
+    assert not output.exists()
+    assert output.with_name(OUTPUT + '.part').exists()
+
+    resumed = run(tree)
+    assert resumed.returncode == 0, resumed.stderr
+    assert '2 depth blocks already done' in resumed.stdout
+    assert output.exists() and not output.with_name(OUTPUT + '.part').exists()
+    assert not output.with_name(OUTPUT + '.progress.json').exists()
+    assert_same_output(output, reference)
+    assert check_manifest(output, deep=True) == []
+
+
+def test_resume_recomputes_a_damaged_block(tree, reference):
+    output = tree / 'processing_nc' / OUTPUT
+    assert run(tree, kill_at=2 * WRITES + 1).returncode == -9
+    with Dataset(output.with_name(OUTPUT + '.part'), mode='a') as ds:
+        ds.variables['vs'][1] = 1.0
+
+    resumed = run(tree)
+    assert resumed.returncode == 0, resumed.stderr
+    assert '1 depth blocks already done' in resumed.stdout
+    assert_same_output(output, reference)
+
+
+def test_code_change_restarts(tree, reference):
+    output = tree / 'processing_nc' / OUTPUT
+    assert run(tree, kill_at=2 * WRITES + 2).returncode == -9
+    with open(tree / 'python_src' / SCRIPT, 'a', encoding='utf-8') as f:
+        f.write('# edited\n')
+
+    rerun = run(tree)
+    assert rerun.returncode == 0, rerun.stderr
+    assert 'Resuming' not in rerun.stdout
+    assert_same_output(output, reference)
+
+
+def test_failed_verification_keeps_part_and_previous_output(tree, reference):
+    output = tree / 'processing_nc' / OUTPUT
+    assert run(tree).returncode == 0
+    before = output.read_bytes()
+
+    # An infinite input value makes a whole dVs(%) layer NaN
+    write_input(tree / 'orig_nc' / INPUT, inf_at=(5, 3, 3))
+    failed = run(tree)
+    assert failed.returncode == 1
+    assert 'all-NaN layers at index [5]' in failed.stderr
+    assert output.read_bytes() == before
+    assert check_manifest(output, deep=True) == []
+    assert output.with_name(OUTPUT + '.part').exists()
+    assert not output.with_name(OUTPUT + '.progress.json').exists()
+
+    # The failed blocks are not reused once the problem is fixed
+    write_input(tree / 'orig_nc' / INPUT)
+    fixed = run(tree)
+    assert fixed.returncode == 0, fixed.stderr
+    assert 'Resuming' not in fixed.stdout
+    assert_same_output(output, reference)
+
+
+def write_blocks(output, data, stop):
+    """Compressed, chunked output of `data` with the depth blocks before `stop` finished"""
+    verifier = OutputVerifier(output)
+    out = ResumableOutput(output, verifier=verifier).__enter__()
+    for name, size in zip(('depth', 'latitude', 'longitude'), data.shape):
+        out.dataset.createDimension(name, size)
+    var = out.dataset.createVariable('vs', np.float32, ('depth', 'latitude', 'longitude'),
+                                     zlib=True, chunksizes=(1,) + data.shape[1:])
+    out.ready()
+    for k0, k1 in out.pending_blocks(data.shape[0], 2):
+        if k0 >= stop:
+            break
+        verifier.write_block(var, k0, data[k0:k1])
+        out.done(k0, k1)
+    return out
+
+
+def test_unreadable_part_starts_again(tmp_path, capsys):
+    output = tmp_path / 'out.nc'
+    data = np.random.default_rng(0).normal(4.5, 0.1, size=(8, 30, 40))
+    write_blocks(output, data, stop=4).dataset.close()   # killed: no __exit__
+
+    # Broken compressed chunks: the file still opens, reading the data fails
+    part = output.with_name(output.name + '.part')
+    raw = bytearray(part.read_bytes())
+    raw[len(raw) * 7 // 8:len(raw) * 7 // 8 + 32] = bytes(32)
+    part.write_bytes(bytes(raw))
+    with Dataset(part) as ds, pytest.raises(RuntimeError):
+        ds.variables['vs'][:4]
+
+    verifier = OutputVerifier(output)
+    with ResumableOutput(output, verifier=verifier) as out:
+        assert out.fresh and not out.completed and not verifier.chunks
+    assert 'Cannot resume' in capsys.readouterr().out
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from tomotools.manifest import OutputVerifier, check_manifest
+
+
+def verify(path, depth, values, name='dVs(%)'):
+    """Write depth + one (depth, latitude, longitude) variable through a verifier"""
+    verifier = OutputVerifier(path)
+    with Dataset(path, mode='w') as ds:
+        ds.createDimension('depth', len(depth))
+        ds.createDimension('latitude', values.shape[1])
+        ds.createDimension('longitude', values.shape[2])
+        verifier.write(ds.createVariable('depth', np.float32, ('depth',)), np.asarray(depth))
+        var = ds.createVariable(name, np.float32, ('depth', 'latitude', 'longitude'), fill_value=-9999.0)
+        for start in range(len(depth)):
+            verifier.write_block(var, start, values[start:start + 1])
+    return verifier
+
+
+def test_values_outside_the_plausible_range_only_warn(tmp_path):
+    values = np.zeros((3, 4, 5))
+    values[0, 0, 0] = -100.0      # water layer: vs = 0 against the layer mean
+    verifier = verify(tmp_path / 'out.nc', [-5.0, 10.0, 100.0], values)
+
+    summary, problems, warnings = verifier.summarize()
+    assert problems == []
+    assert any("'dVs(%)' range" in message for message in warnings)
+    assert any("'depth' range" in message for message in warnings)
+    assert summary['dVs(%)']['min'] == -100.0 and summary['depth']['min'] == -5.0
+
+    verifier.finish()
+    assert check_manifest(tmp_path / 'out.nc', deep=True) == []
+
+
+@pytest.mark.parametrize('depth, layer, message', [
+    ([0.0, 100.0, 50.0], None, "not strictly monotonic"),
+    ([0.0, np.nan, 100.0], None, "NaN values"),
+    ([0.0, 50.0, 100.0], np.nan, "all-NaN layers at index [1]"),
+])
+def test_structural_problems_fail(tmp_path, depth, layer, message):
+    values = np.ones((3, 4, 5))
+    if layer is not None:
+        values[1] = layer
+    verifier = verify(tmp_path / 'out.nc', depth, values)
+
+    _, problems, _ = verifier.summarize()
+    assert any(message in problem for problem in problems)
+    with pytest.raises(RuntimeError):
+        verifier.finish()
+    assert check_manifest(tmp_path / 'out.nc')
+
+
+def test_all_fill_layer_warns(tmp_path):
+    values = np.ma.masked_array(np.ones((3, 4, 5)))
+    values[2] = np.ma.masked
+    verifier = verify(tmp_path / 'out.nc', [0.0, 50.0, 100.0], values)
+
+    _, problems, warnings = verifier.summarize()
+    assert problems == []
+    assert any("all-fill layers at index [2]" in message for message in warnings)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from tomotools.grid import ModelGrid
+from tomotools.profiles import extract_from_variable, extract_profiles, write_column_major
+
+DEPTH = [0, 50, 200, 600, 1200]
+LON_360 = np.arange(0, 360, 10.0)
+
+
+def field(depth, lat, lon):
+    return depth / 1000 + np.cos(np.radians(lat)) * np.sin(np.radians(2 * lon)) + lat / 90
+
+
+def stations(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(-90, 90, n)
+    lons = rng.uniform(-180, 360, n)
+    # Columns between the last and the first longitude of a 0-360 grid
+    lons[:20] = rng.uniform(350, 360, 20)
+    lons[20:40] = rng.uniform(-10, 0, 20)
+    return lats, lons
+
+
+def reference_profiles(path, lats, lons):
+    """Trilinear interpolation of the whole model in memory, one point per depth node"""
+    with Dataset(path) as ds:
+        grid = ModelGrid(ds, 'dVs(%)')
+        values = grid.read(ds.variables['dVs(%)'])
+    depth = np.broadcast_to(grid.depth[None, :], (lats.size, grid.depth.size))
+    return grid.interpolate(values, depth, lats[:, None] + 0 * depth, lons[:, None] + 0 * depth)
+
+
+@pytest.mark.parametrize('lat', [np.arange(-90, 90.1, 10.0), np.arange(90, -90.1, -10.0)],
+                         ids=['ascending-lat', 'descending-lat'])
+@pytest.mark.parametrize('tile', [2, 4, 32])
+def test_tiles_and_seam_match_whole_model_interpolation(make_model, lat, tile):
+    path = make_model('model.nc', DEPTH, lat, LON_360, values=field)
+    lats, lons = stations()
+    with Dataset(path) as ds:
+        grid = ModelGrid(ds, 'dVs(%)')
+        assert grid.periodic
+        profiles = extract_from_variable(ds.variables['dVs(%)'], grid, lats, lons, tile=tile)
+    np.testing.assert_allclose(profiles, reference_profiles(path, lats, lons), rtol=1e-12, atol=1e-12)
+
+
+def test_seam_columns_use_both_edge_longitudes(make_model):
+    # Linear in latitude only: bilinear interpolation is exact everywhere
+    path = make_model('model.nc', DEPTH, np.arange(-90, 90.1, 10.0), LON_360,
+                      values=lambda d, la, lo: d / 1000 + la / 90 + 0 * lo)
+    lats = np.array([12.5, -47.0, 3.0])
+    lons = np.array([355.0, -5.0, 359.9])
+    depth, profiles = extract_profiles(path, lats, lons, tile=2)
+    np.testing.assert_allclose(profiles, np.asarray(depth)[None, :] / 1000 + lats[:, None] / 90,
+                               rtol=1e-6)
+
+
+def test_grid_nodes_return_stored_values(make_model):
+    lat = np.arange(90, -90.1, -10.0)
+    path = make_model('model.nc', DEPTH, lat, LON_360, values=field)
+    lats = np.array([80.0, -30.0, 0.0, -90.0])
+    lons = np.array([350.0, 0.0, 170.0, 40.0])
+    _, profiles = extract_profiles(path, lats, lons, tile=4)
+    expected = field(np.asarray(DEPTH, float)[None, :], lats[:, None], lons[:, None])
+    np.testing.assert_allclose(profiles, expected.astype(np.float32), rtol=1e-6)
+
+
+def test_fill_values_only_spoil_columns_that_touch_them(make_model):
+    nan_node = lambda d, la, lo: np.where((la == 0) & (lo == 350), np.nan, 1.0 + 0 * d)
+    path = make_model('model.nc', DEPTH, np.arange(-90, 90.1, 10.0), LON_360, values=nan_node)
+    _, profiles = extract_profiles(path, [5.0, 0.0, 30.0], [355.0, 345.0, 355.0], tile=2)
+    assert np.isnan(profiles[0]).all() and np.isnan(profiles[1]).all()
+    np.testing.assert_array_equal(profiles[2], 1.0)
+
+
+@pytest.mark.parametrize('lat', [np.arange(-90, 90.1, 10.0), np.arange(90, -90.1, -10.0)],
+                         ids=['ascending-lat', 'descending-lat'])
+def test_depth_major_and_column_major_agree(make_model, lat):
+    path = make_model('model.nc', DEPTH, lat, LON_360, values=field)
+    companion = write_column_major(path, band_bytes=4 * len(DEPTH) * LON_360.size * 3)
+    with Dataset(companion) as ds:
+        assert ds.variables['dVs(%)'].dimensions == ('latitude', 'longitude', 'depth')
+
+    lats, lons = stations()
+    depth_a, depth_major = extract_profiles(path, lats, lons, layout='depth-major', tile=4)
+    depth_b, column_major = extract_profiles(path, lats, lons, layout='column-major', tile=4)
+    np.testing.assert_array_equal(depth_a, depth_b)
+    np.testing.assert_array_equal(depth_major, column_major)
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from tomotools.grid import area_weights
+from tomotools.pyramid import build_pyramid, coarsen, list_levels, select_level
+
+DEPTH = [0, 100, 200, 400, 800, 1600]
+
+
+def grid(step):
+    return np.arange(-90, 90.1, step), np.arange(-180, 180, step)
+
+
+def test_coarsen_is_an_area_weighted_mean_of_the_valid_nodes():
+    lat = np.array([0.0, 30.0, 60.0])
+    weights = area_weights(lat)
+    block = np.array([[[1.0, 2.0], [3.0, np.nan], [5.0, 6.0]]])
+    coarse = coarsen(block, weights, (1, 3, 2))
+    valid = ~np.isnan(block[0])
+    w = np.broadcast_to(weights[:, None], valid.shape)
+    assert coarse.shape == (1, 1, 1)
+    assert coarse[0, 0, 0] == pytest.approx(np.sum(w[valid] * block[0][valid]) / np.sum(w[valid]))
+
+
+def test_coarsen_partial_edge_groups_and_empty_cells():
+    block = np.arange(5 * 5 * 3, dtype=np.float64).reshape(5, 5, 3)
+    block[4:, :2, :2] = np.nan          # one coarse cell of the last depth group without data
+    weights = np.ones(5)
+    coarse = coarsen(block, weights, (2, 2, 2))
+    assert coarse.shape == (3, 3, 2)
+    # Trailing groups average over the nodes they have
+    assert coarse[0, 2, 1] == pytest.approx(block[0:2, 4:5, 2:3].mean())
+    assert coarse[1, 1, 0] == pytest.approx(block[2:4, 2:4, 0:2].mean())
+    assert np.isnan(coarse[2, 0, 0])
+    assert coarse[2, 0, 1] == pytest.approx(block[4:5, 0:2, 2:3].mean())
+
+
+def build(make_model, step, **kwargs):
+    lat, lon = grid(step)
+    values = lambda d, la, lo: d / 1000 + np.cos(np.radians(la)) * np.sin(np.radians(lo))
+    path = make_model(f'g{step:g}.nc', DEPTH, lat, lon, values=values)
+    return path, build_pyramid(path, **kwargs)
+
+
+def attributes(path):
+    with Dataset(path) as ds:
+        return (float(ds.preview_resolution_deg), int(ds.preview_depth_stride),
+                np.diff(ds.variables['latitude'][:2])[0], ds.variables['depth'].size)
+
+
+def test_half_degree_grid_builds_every_level(make_model):
+    path, written = build(make_model, 0.5)
+    assert [p.name for p in written] == ['g0.5.r1.nc', 'g0.5.r2.nc']
+    assert attributes(written[0]) == (1.0, 2, 1.0, 3)
+    assert attributes(written[1]) == (2.0, 4, 2.0, 2)
+    assert select_level(path, 0.7) == path
+    assert select_level(path, 1.0) == written[0]
+    assert select_level(path, 5.0) == written[1]
+
+
+def test_one_degree_grid_skips_the_native_resolution_level(make_model):
+    path, written = build(make_model, 1.0)
+    # (1.0, 2) would only average depths at native resolution
+    assert [p.name for p in written] == ['g1.r2.nc']
+    assert attributes(written[0]) == (2.0, 4, 2.0, 2)
+    assert select_level(path, 1.0) == path
+    assert select_level(path, 1.5) == path
+    assert select_level(path, 2.0) == written[0]
+    assert [level[:2] for level in list_levels(path)] == [(1.0, 1), (2.0, 4)]
+
+
+def test_two_degree_grid_writes_nothing_named_finer_than_it_is(make_model):
+    path, written = build(make_model, 2.0)
+    assert written == []
+    assert select_level(path, 5.0) == path
+
+    # A 3 degree request on a 2 degree grid rounds to 2 cells: named after 4 degrees
+    path, written = build(make_model, 2.0, levels=((3.0, 1),))
+    assert [p.name for p in written] == ['g2.r4.nc']
+    assert attributes(written[0])[0] == 4.0
+
+
+def test_same_spacing_keeps_the_first_level_and_selection_prefers_fine_depths(make_model):
+    path, written = build(make_model, 0.5, levels=((1.0, 1), (1.0, 2)))
+    assert [p.name for p in written] == ['g0.5.r1.nc']
+    assert attributes(written[0])[1] == 1
+    assert select_level(path, 1.0) == written[0]
+
+
+def test_fill_values_stay_fill_in_preview_levels(make_model):
+    lat, lon = grid(0.5)
+    # Fill below 1000 km east of 100E
+    values = lambda d, la, lo: np.where((d > 1000) & (lo > 100), np.nan, 1.0 + 0 * la)
+    path = make_model('fill.nc', DEPTH, lat, lon, values=values)
+    level = build_pyramid(path, levels=((2.0, 1),))[0]
+    with Dataset(level) as ds:
+        data = ds.variables['dVs(%)'][:]
+        lon_level = ds.variables['longitude'][:]
+    assert np.ma.getmaskarray(data[-1][:, lon_level > 101]).all()
+    assert not np.ma.getmaskarray(data[:-1]).any()
+    np.testing.assert_allclose(data.compressed(), 1.0)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from tomotools.grid import area_weights
+from tomotools.reductions import depth_mean, fill_to_nan, layer_weights
+
+LAT = np.linspace(-90, 90, 37)
+LON = np.arange(-180, 180, 10.0)
+
+
+def masked_block(holes=True, empty_layer=True, seed=0):
+    """
+    (depth, lon, lat) float32 masked block as netCDF4 returns it: no mask array
+    at all without holes, else a few scattered holes and optionally an all-fill layer
+    """
+    rng = np.random.default_rng(seed)
+    data = (4.5 + 0.1 * rng.standard_normal((5, LON.size, LAT.size))).astype(np.float32)
+    if not holes:
+        return np.ma.masked_array(data)
+    mask = rng.random(data.shape) < 0.1
+    mask[0] = False
+    if empty_layer:
+        mask[3] = True
+    return np.ma.masked_array(data, mask)
+
+
+def legacy_mean(block):
+    """What the scripts computed before: masked arithmetic on the transposed block"""
+    vs = np.transpose(np.sqrt((2 * block**2 + block**2) / 3), (0, 2, 1))
+    return np.ma.filled(np.mean(vs, axis=(1, 2)), np.nan)
+
+
+def nan_values(block):
+    vs = np.transpose(fill_to_nan(block), (0, 2, 1))
+    return np.sqrt((2 * vs**2 + vs**2) / 3)
+
+
+@pytest.mark.parametrize('holes, empty_layer', [(False, False), (True, False), (True, True)])
+def test_unweighted_matches_masked_mean_bit_for_bit(holes, empty_layer):
+    block = masked_block(holes, empty_layer)
+    values = nan_values(block)
+    assert not values.flags.c_contiguous      # transposed view, as in the scripts
+
+    result = depth_mean(values)
+    np.testing.assert_array_equal(result, legacy_mean(block))
+    assert np.isnan(result[3]) == empty_layer
+
+
+def closed_form_area_mean(values, weights):
+    """sum(w * v) / sum(w) over the valid nodes of each (depth, lat, lon) layer"""
+    result = np.full(values.shape[0], np.nan)
+    for k, layer in enumerate(values):
+        w = np.broadcast_to(weights[:, None], layer.shape)
+        valid = ~np.isnan(layer)
+        if valid.any():
+            result[k] = np.sum(w[valid] * layer[valid]) / np.sum(w[valid])
+    return result
+
+
+@pytest.mark.parametrize('lat_axis', [1, 2])
+def test_area_mean_matches_closed_form(lat_axis):
+    block = masked_block()
+    values = nan_values(block)                # (depth, lat, lon)
+    weights = layer_weights(LAT, 'area')
+    expected = closed_form_area_mean(values, weights)
+
+    if lat_axis == 2:
+        values = np.transpose(values, (0, 2, 1))
+    result = depth_mean(values, weights, lat_axis)
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+    assert np.isnan(result[3])
+
+
+def test_area_mean_of_a_latitude_field():
+    # Mean of sin^2(lat) over the sphere is 1/3; the unweighted grid mean is 1/2
+    lat = np.linspace(-90, 90, 721)
+    values = np.broadcast_to(np.sin(np.radians(lat))[None, :, None] ** 2, (1, lat.size, 8))
+    assert depth_mean(values, area_weights(lat), 1)[0] == pytest.approx(1 / 3, abs=1e-5)
+    assert depth_mean(values)[0] == pytest.approx(0.5, abs=1e-2)
+
+
+def test_fill_to_nan_and_modes():
+    block = masked_block()
+    values = fill_to_nan(block)
+    assert values.dtype == np.float64
+    np.testing.assert_array_equal(np.isnan(values), np.ma.getmaskarray(block))
+    assert fill_to_nan(block, np.float32).dtype == np.float32
+    assert layer_weights(LAT) is None
+    with pytest.raises(ValueError):
+        layer_weights(LAT, 'cosine')
@@ -0,0 +1,134 @@
+import http.client
+import threading
+
+import numpy as np
+import pytest
+
+from tomotools.service import Client, ResidentModel, make_server
+
+DEPTH = [0, 100, 400, 1000, 2000]
+LAT = np.arange(-90, 90.1, 5.0)
+LON = np.arange(-180, 180, 5.0)
+
+
+@pytest.fixture
+def model(make_model):
+    return make_model('m35.nc', DEPTH, LAT, LON, absolute=4.5)
+
+
+def serve(models, **kwargs):
+    server = make_server(models, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def tcp_server(model):
+    # A long window so that concurrent requests certainly share a batch
+    server = serve([model], port=0, window=0.3)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client_for(server):
+    return Client(port=server.server_address[1], timeout=10)
+
+
+def concurrently(calls):
+    results = [None] * len(calls)
+    barrier = threading.Barrier(len(calls))
+
+    def run(i, call):
+        barrier.wait()
+        results[i] = call()
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_requests_are_coalesced_and_split_back(tcp_server, model):
+    client = client_for(tcp_server)
+    resident = ResidentModel(model)
+    rng = np.random.default_rng(0)
+    requests = [np.column_stack((rng.uniform(0, 2000, n), rng.uniform(-90, 90, n), rng.uniform(-180, 180, n)))
+                for n in (1, 7, 50, 3, 200, 12)]
+
+    results = concurrently([lambda rows=rows: client.points('m35', *rows.T) for rows in requests])
+    for rows, result in zip(requests, results):
+        assert result.shape == (len(rows),)
+        np.testing.assert_array_equal(result, resident.evaluate('point', 'dVs(%)', rows))
+
+    counters = client.metrics()['endpoints']['m35/point']
+    assert counters['requests'] == len(requests)
+    assert counters['rows'] == sum(len(rows) for rows in requests)
+    assert counters['batches'] == 1
+
+
+def test_mixed_kinds_and_variables_in_one_window(tcp_server, model):
+    client = client_for(tcp_server)
+    resident = ResidentModel(model)
+    lat, lon = np.array([10.0, -33.3]), np.array([170.0, 359.0])
+    depths = np.array([50.0, 1500.0])
+
+    profiles, vs_profiles, slices = concurrently([
+        lambda: client.profiles('m35', lat, lon),
+        lambda: client.profiles('m35', lat, lon, var='vs'),
+        lambda: client.slices('m35', depths),
+    ])
+    rows = np.column_stack((lat, lon))
+    np.testing.assert_array_equal(profiles, resident.evaluate('profile', 'dVs(%)', rows))
+    np.testing.assert_allclose(vs_profiles, 4.5)
+    assert slices.shape == (2, LAT.size, LON.size)
+    np.testing.assert_array_equal(slices, resident.evaluate('slice', 'dVs(%)', depths[:, None]))
+
+
+def post(server, path, body=b''):
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    try:
+        conn.request('POST', path, body=body)
+        response = conn.getresponse()
+        return response.status, response.read().decode('utf-8')
+    finally:
+        conn.close()
+
+
+def test_error_replies(tcp_server, monkeypatch):
+    row = np.zeros(3).tobytes()
+    assert post(tcp_server, '/point?model=nope', row)[0] == 400
+    status, text = post(tcp_server, '/point?model=m35&var=vp', row)
+    assert status == 400 and 'Unknown variable' in text
+    status, text = post(tcp_server, '/point?model=m35', np.zeros(4).tobytes())
+    assert status == 400 and '3 float64 values per row' in text
+    assert post(tcp_server, '/volume?model=m35', row)[0] == 404
+
+    def broken(kind, varname, rows):
+        raise MemoryError("too many rows")
+    monkeypatch.setattr(tcp_server.batchers['m35'].model, 'evaluate', broken)
+    status, text = post(tcp_server, '/point?model=m35', row)
+    assert status == 500 and 'MemoryError: too many rows' in text
+
+    with pytest.raises(RuntimeError, match='Unknown model'):
+        client_for(tcp_server).points('nope', [0], [0], [0])
+
+
+def test_unix_socket(model, tmp_path):
+    path = str(tmp_path / 'tomo.sock')
+    server = serve([model], unix_socket=path, window=0.3)
+    try:
+        client = Client(unix_socket=path, timeout=10)
+        assert list(client.models()) == ['m35']
+        results = concurrently([lambda i=i: client.points('m35', [100.0 * i], [0.0], [0.0]) for i in range(5)])
+        resident = ResidentModel(model)
+        for i, result in enumerate(results):
+            expected = resident.evaluate('point', 'dVs(%)', np.array([[100.0 * i, 0.0, 0.0]]))
+            np.testing.assert_array_equal(result, expected)
+        assert client.metrics()['endpoints']['m35/point']['batches'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
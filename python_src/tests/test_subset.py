@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from tomotools.grid import ModelGrid
+from tomotools.subset import plan_subset, subset_model, subset_models
+
+LAT = np.arange(-90, 90.1, 10.0)
+DEPTH = [0, 100, 400, 1000]
+
+
+def lon_value(depth, lat, lon):
+    """A field that identifies the longitude in either convention"""
+    return np.mod(lon + 180.0, 360.0) - 180.0
+
+
+def plan_for(make_model, lon, lat_range, lon_range, depth_range=None, **kwargs):
+    path = make_model('model.nc', DEPTH, LAT, lon, **kwargs)
+    with Dataset(path) as ds:
+        return plan_subset(ModelGrid(ds, 'dVs(%)'), lat_range, lon_range, depth_range)
+
+
+@pytest.mark.parametrize('lon_range', [(170, -170), (170, 190), (-190, -170)])
+def test_dateline_box_on_a_pm180_grid(make_model, lon_range):
+    plan = plan_for(make_model, np.arange(-180, 180, 10.0), (-20, 20), lon_range)
+    assert plan.lon_slices == [slice(35, 36), slice(0, 2)]
+    np.testing.assert_array_equal(plan.lon_values, [170, 180, 190])
+
+
+@pytest.mark.parametrize('lon_range', [(350, 10), (-10, 10)])
+def test_greenwich_box_on_a_0_360_grid(make_model, lon_range):
+    plan = plan_for(make_model, np.arange(0, 360, 10.0), (-20, 20), lon_range)
+    assert plan.lon_slices == [slice(35, 36), slice(0, 2)]
+    np.testing.assert_array_equal(plan.lon_values, [-10, 0, 10])
+
+
+def test_repeated_end_column_is_read_once(make_model):
+    plan = plan_for(make_model, np.arange(0, 360.1, 10.0), (-20, 20), (350, 10))
+    np.testing.assert_array_equal(plan.lon_values, [-10, 0, 10])
+    assert plan.lon_slices == [slice(35, 37), slice(1, 2)]
+
+
+def test_box_inside_the_grid_is_one_hyperslab(make_model):
+    plan = plan_for(make_model, np.arange(0, 360, 10.0), (-20, 20), (-30, -10), depth_range=(50, 500))
+    assert plan.lon_slices == [slice(33, 36)]
+    np.testing.assert_array_equal(plan.lon_values, [-30, -20, -10])
+    np.testing.assert_array_equal(plan.depth_values, [100, 400])
+    np.testing.assert_array_equal(plan.lat_values, [-20, -10, 0, 10, 20])
+
+
+def test_whole_circle(make_model):
+    plan = plan_for(make_model, np.arange(-180, 180, 10.0), (-20, 20), (-180, 180))
+    assert plan.lon_values.size == 36 and np.all(np.diff(plan.lon_values) == 10)
+
+
+def test_no_nodes_in_box(make_model):
+    with pytest.raises(ValueError):
+        plan_for(make_model, np.arange(-180, 180, 10.0), (-20, 20), (171, 179))
+
+
+@pytest.mark.parametrize('dimensions', [('depth', 'latitude', 'longitude'), ('depth', 'longitude', 'latitude')])
+def test_subset_across_the_dateline_keeps_values(make_model, tmp_path, dimensions):
+    model = make_model('model.nc', DEPTH, LAT, np.arange(0, 360, 10.0), values=lon_value,
+                       dimensions=dimensions)
+    output = subset_model(model, tmp_path / 'out.nc', (-20, 20), (160, -160))
+    with Dataset(output) as ds:
+        lon = ds.variables['longitude'][:]
+        values = ds.variables['dVs(%)'][:]
+        assert ds.variables['dVs(%)'].dimensions == ('depth', 'latitude', 'longitude')
+    np.testing.assert_array_equal(lon, [160, 170, 180, 190, 200])
+    np.testing.assert_array_equal(values[0, 0], [160, 170, -180, -170, -160])
+    assert values.shape == (len(DEPTH), 5, 5)
+
+
+def test_subset_models_reports_failed_models(make_model, tmp_path):
+    model = make_model('model.nc', DEPTH, LAT, np.arange(-180, 180, 10.0))
+    outputs, failures = subset_models([model, tmp_path / 'missing.nc'], tmp_path / 'out',
+                                      (-20, 20), (170, -170), workers=1)
+    assert [path.name for path in outputs] == ['model_subset.nc']
+    assert list(failures) == [str(tmp_path / 'missing.nc')]
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from tomotools.traveltime import EARTH_RADIUS, arc_nodes, integrate_model, sample_paths, score_models
+
+DELTA = np.array([10.0, 60.0, 120.0, 170.0])
+TURNING = np.array([50.0, 700.0, 1500.0, 2800.0])
+
+
+def test_arc_nodes_end_at_source_and_receiver_on_the_surface():
+    theta, radius = arc_nodes(DELTA, TURNING, nsample=100)
+    np.testing.assert_allclose(theta[:, 0], 0.0, atol=1e-9)
+    np.testing.assert_allclose(theta[:, -1], DELTA, atol=1e-9)
+    np.testing.assert_allclose(radius[:, [0, -1]], EARTH_RADIUS, atol=1e-6)
+    assert np.all(np.diff(theta, axis=1) > 0)
+
+
+def test_arc_nodes_turn_at_the_turning_depth_halfway():
+    theta, radius = arc_nodes(DELTA, TURNING, nsample=100)
+    np.testing.assert_allclose(radius.min(axis=1), EARTH_RADIUS - TURNING, atol=1e-6)
+    np.testing.assert_allclose(radius[:, 50], EARTH_RADIUS - TURNING, atol=1e-6)
+    np.testing.assert_allclose(theta[:, 50], DELTA / 2, atol=1e-9)
+    # The arc is symmetric about the turning point
+    np.testing.assert_allclose(radius, radius[:, ::-1], atol=1e-6)
+
+
+def test_arc_nodes_straight_chord_and_shallower_arc():
+    # Turning depth of the straight chord, and an arc above it
+    chord = EARTH_RADIUS * (1 - np.cos(np.radians(DELTA / 2)))
+    for depth in (chord, chord / 2):
+        theta, radius = arc_nodes(DELTA, depth, nsample=100)
+        assert np.all(np.isfinite(theta)) and np.all(np.isfinite(radius))
+        np.testing.assert_allclose(radius[:, [0, -1]], EARTH_RADIUS, atol=1e-6)
+        np.testing.assert_allclose(radius[:, 50], EARTH_RADIUS - depth, atol=1e-3)
+
+
+def test_samples_below_the_model_are_missing(make_model):
+    lat, lon = np.arange(-90, 90.1, 5.0), np.arange(-180, 180, 5.0)
+    model = make_model('shallow.nc', [0, 200, 400, 600, 800, 1000], lat, lon,
+                       values=lambda d, la, lo: 1.0 + 0 * d, absolute=4.5)
+    samples = sample_paths([0, 0], [0, 0], [0, 0], [20, 60], turning_depth=[500, 2000], nsample=200)
+    delay, coverage = integrate_model(model, *samples)
+
+    assert coverage[0] == pytest.approx(1.0)
+    assert 0 < coverage[1] < 1
+    # 1 % faster over the covered length only
+    length = np.sum(samples[3], axis=1) * coverage
+    np.testing.assert_allclose(delay, -length * 0.01 / 4.5, rtol=1e-6)
+
+
+def test_score_models_reports_failed_models(make_model, tmp_path):
+    lat, lon = np.arange(-90, 90.1, 5.0), np.arange(-180, 180, 5.0)
+    good = make_model('good.nc', [0, 500, 1000], lat, lon, absolute=4.5)
+    no_reference = make_model('S40RTS_dvs.nc', [0, 500, 1000], lat, lon, name='v')
+    samples = sample_paths([0], [0], [0], [30], turning_depth=[300])
+
+    results, failures = score_models([good, no_reference, tmp_path / 'missing.nc'], samples, workers=1)
+    assert list(results) == [str(good)]
+    assert set(failures) == {str(no_reference), str(tmp_path / 'missing.nc')}
+    assert '--reference' in failures[str(no_reference)]
+
+    results, failures = score_models([no_reference], samples, reference=([0, 1000], [4.5, 4.5]), workers=1)
+    assert not failures and np.isfinite(results[str(no_reference)][0]).all()
+
+
+@pytest.mark.parametrize('reference', [([0, 2000], [3.5, 6.5]), ([2000, 0], [6.5, 3.5])])
+def test_descending_depth_axis_gives_the_same_delays(make_model, reference):
+    lat, lon = np.arange(-90, 90.1, 5.0), np.arange(-180, 180, 5.0)
+    depth = np.array([0, 200, 400, 700, 1000, 1500, 2000])
+    field = lambda d, la, lo: 1.0 + d / 1000 + np.sin(np.radians(lo))
+    ascending = make_model('ascending.nc', depth, lat, lon, values=field)
+    descending = make_model('descending.nc', depth[::-1], lat, lon, values=field)
+    samples = sample_paths([0, 10], [0, 20], [0, -10], [40, 80], turning_depth=[300, 1200], nsample=100)
+
+    expected = integrate_model(ascending, *samples, reference=reference)
+    result = integrate_model(descending, *samples, reference=reference)
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
+    np.testing.assert_allclose(expected[1], 1.0)
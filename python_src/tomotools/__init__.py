@@ -0,0 +1,6 @@
+"""
+Shared helpers for querying and post-processing the converted tomography models.
+
+Each module can also be run as a command line tool from the python_src directory,
+e.g. ``python -m tomotools.profiles --help``.
+"""
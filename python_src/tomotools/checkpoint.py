@@ -0,0 +1,203 @@
+"""
+Crash-safe, resumable conversion outputs.
+
+A conversion writes to <output>.part and records every finished depth block in
+<output>.progress.json. If the job is killed, the next run reopens the .part
+file, re-checks the checksums of the finished blocks (recorded by the
+OutputVerifier) and only computes the missing blocks. When all blocks are done
+the verifier checks are evaluated first; only if they pass is the .part file
+renamed to the final name in one atomic step, so a processing_nc/*.nc file
+under its final name is always complete and verified. A failed check keeps the
+.part file for inspection, leaves the previous output untouched and drops the
+progress record, so the next run starts again.
+
+The progress record is only reused while the inputs, the script settings and
+the code (the running script and the tomotools sources) are unchanged, and a
+.part file that can no longer be read is discarded, so a resumed file never
+mixes blocks written by different code.
+
+    verifier = OutputVerifier(output_filename)
+    with ResumableOutput(output_filename, [input_filename], verifier) as out:
+        dst = out.dataset
+        if out.fresh:
+            ...create dimensions, coordinates and variables...
+            out.ready()
+        for k0, k1 in out.pending_blocks(ndepth, depth_block):
+            ...verifier.write_block(var, k0, data)...
+            out.done(k0, k1)
+    verifier.finish()
+"""
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from netCDF4 import Dataset
+
+from .manifest import stored_bytes
+
+PART_SUFFIX = '.part'
+PROGRESS_SUFFIX = '.progress.json'
+
+
+def _code_hash():
+    """sha256 of the running script and of the tomotools sources"""
+    paths = sorted(Path(__file__).resolve().parent.glob('*.py'))
+    script = getattr(sys.modules.get('__main__'), '__file__', None)
+    if script:
+        paths.insert(0, Path(script).resolve())
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.name.encode('utf-8') + b'\0')
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _signature(inputs, settings=None):
+    """
+    Size and modification time of the inputs, the script settings and a hash of
+    the code, so a changed input, setting or code restarts the job
+    """
+    signature = {}
+    for path in inputs:
+        stat = os.stat(path)
+        signature[str(Path(path).resolve())] = [stat.st_size, stat.st_mtime_ns]
+    if settings:
+        signature['settings'] = dict(settings)
+    signature['code'] = _code_hash()
+    return signature
+
+
+class ResumableOutput:
+    """Temporary output file with per-depth-block checkpoints and an atomic final rename"""
+
+    def __init__(self, output_filename, inputs=(), verifier=None, settings=None):
+        self.output = Path(output_filename)
+        self.part = self.output.with_name(self.output.name + PART_SUFFIX)
+        self.progress_path = self.output.with_name(self.output.name + PROGRESS_SUFFIX)
+        self.signature = _signature(inputs, settings)
+        self.verifier = verifier
+        self.completed = set()
+        self.fresh = True
+        self.dataset = None
+
+    # ---------------------------- open / close ----------------------------
+    def __enter__(self):
+        progress = self._load_progress()
+        if progress is not None:
+            try:
+                self._resume(progress)
+            except (OSError, RuntimeError, KeyError, ValueError) as exc:
+                # e.g. a kill in the middle of an HDF5 write: the .part opens but its chunks are broken
+                print(f"⚠️  Cannot resume {self.output.name} ({type(exc).__name__}: {exc}), starting again")
+                self._discard()
+        if self.dataset is not None:
+            print(f"♻️  Resuming {self.output.name}: {len(self.completed)} depth blocks already done")
+        else:
+            for path in (self.part, self.progress_path):
+                if path.exists():
+                    path.unlink()
+            self.dataset = Dataset(self.part, mode='w')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.dataset.close()
+        if exc_type is not None:
+            return False
+        if self.verifier is not None:
+            _, problems, _ = self.verifier.summarize()
+            if problems:
+                # The finished blocks are not reused: the next run starts again
+                if self.progress_path.exists():
+                    self.progress_path.unlink()
+                raise RuntimeError(f"{self.output.name} failed verification, kept {self.part.name}:\n  "
+                                   + "\n  ".join(problems))
+        os.replace(self.part, self.output)
+        if self.progress_path.exists():
+            self.progress_path.unlink()
+        return False
+
+    # ---------------------------- checkpoints ----------------------------
+    def ready(self):
+        """Mark the setup (dimensions, coordinates, attributes) as written"""
+        self._save_progress()
+
+    def pending_blocks(self, n, size):
+        """(start, stop) depth blocks that still have to be written"""
+        for start in range(0, n, size):
+            block = (start, min(start + size, n))
+            if block not in self.completed:
+                yield block
+
+    def done(self, start, stop):
+        """Flush the block to disk and record it as finished"""
+        self.completed.add((start, stop))
+        self._save_progress()
+
+    def _resume(self, progress):
+        """Reopen the .part file and restore the finished blocks and verifier state"""
+        self.dataset = Dataset(self.part, mode='a')
+        self.fresh = False
+        self.completed = {tuple(block) for block in progress['completed']}
+        if self.verifier is not None:
+            self.verifier.variables = progress['variables']
+            self.verifier.chunks = {name: {int(start): entry for start, entry in chunks.items()}
+                                    for name, chunks in progress['chunks'].items()}
+            self._recheck()
+
+    def _discard(self):
+        """Forget a failed resume attempt"""
+        if self.dataset is not None:
+            try:
+                self.dataset.close()
+            except (OSError, RuntimeError):
+                pass
+        self.dataset = None
+        self.fresh = True
+        self.completed = set()
+        if self.verifier is not None:
+            self.verifier.variables = {}
+            self.verifier.chunks = {}
+
+    def _load_progress(self):
+        if not (self.progress_path.exists() and self.part.exists()):
+            return None
+        try:
+            with open(self.progress_path, encoding='utf-8') as f:
+                progress = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if progress.get('signature') != self.signature:
+            return None
+        return progress
+
+    def _save_progress(self):
+        # Data first, then the record that points at it
+        self.dataset.sync()
+        progress = {
+            'signature': self.signature,
+            'completed': sorted(self.completed),
+            'variables': self.verifier.variables if self.verifier is not None else {},
+            'chunks': self.verifier.chunks if self.verifier is not None else {},
+        }
+        tmp = self.progress_path.with_name(self.progress_path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(progress, f)
+        os.replace(tmp, self.progress_path)
+
+    def _recheck(self):
+        """Drop finished blocks whose stored bytes no longer match their checksums"""
+        self.dataset.set_auto_mask(False)
+        try:
+            for name, chunks in self.verifier.chunks.items():
+                variable = self.dataset.variables[name]
+                for start, entry in chunks.items():
+                    blocks = [block for block in self.completed if block[0] <= start < block[1]]
+                    if not blocks:
+                        continue
+                    data = variable[start:start + entry['rows']]
+                    if hashlib.sha256(stored_bytes(data, variable)).hexdigest() != entry['sha256']:
+                        self.completed.difference_update(blocks)
+        finally:
+            self.dataset.set_auto_mask(True)
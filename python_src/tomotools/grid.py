@@ -0,0 +1,222 @@
+"""
+Depth / latitude / longitude axis handling shared by the tomotools modules
+"""
+import copy
+
+import numpy as np
+
+DEPTH_NAMES = ('depth',)
+LAT_NAMES = ('latitude', 'lat')
+LON_NAMES = ('longitude', 'lon')
+
+
+def _match(dimensions, candidates):
+    """Return the dimension name in `dimensions` that matches one of `candidates`"""
+    for name in dimensions:
+        if name.lower() in candidates:
+            return name
+    return None
+
+
+def is_model_variable(variable):
+    """True if the variable is a 3-D (depth, latitude, longitude) field in any order"""
+    dims = variable.dimensions
+    return (len(dims) == 3
+            and _match(dims, DEPTH_NAMES) is not None
+            and _match(dims, LAT_NAMES) is not None
+            and _match(dims, LON_NAMES) is not None)
+
+
+def model_variables(ds):
+    """Names of all 3-D model variables in an open Dataset"""
+    return [name for name, var in ds.variables.items() if is_model_variable(var)]
+
+
+def pick_variable(ds, varname=None):
+    """Return `varname`, or the first 3-D model variable in the Dataset"""
+    if varname is not None:
+        if varname not in ds.variables:
+            raise KeyError(f"Variable '{varname}' not found, available: {model_variables(ds)}")
+        return varname
+    names = model_variables(ds)
+    if not names:
+        raise ValueError("No (depth, latitude, longitude) variable found")
+    return names[0]
+
+
+def normalize_lon(lon, lon_min):
+    """Wrap longitudes into [lon_min, lon_min + 360)"""
+    return lon_min + np.mod(np.asarray(lon, dtype=np.float64) - lon_min, 360.0)
+
+
+def bracket(axis, x, periodic=False):
+    """
+    Find linear interpolation brackets on a monotonic axis.
+
+    Returns (i0, i1, w) such that the value at x is (1 - w) * a[i0] + w * a[i1].
+    Outside the axis range the edge value is used, unless `periodic` is set, in
+    which case the last node wraps around to the first one (360° longitudes).
+    """
+    axis = np.asarray(axis, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    n = axis.size
+    if n == 1:
+        zero = np.zeros(x.shape, dtype=np.intp)
+        return zero, zero, np.zeros(x.shape)
+
+    descending = axis[0] > axis[-1]
+    a = axis[::-1] if descending else axis
+
+    if periodic:
+        ext = np.append(a, a[0] + 360.0)
+        x = normalize_lon(x, a[0])
+        i0 = np.clip(np.searchsorted(ext, x, side='right') - 1, 0, n - 1)
+        w = (x - ext[i0]) / (ext[i0 + 1] - ext[i0])
+        i1 = (i0 + 1) % n
+    else:
+        x = np.clip(x, a[0], a[-1])
+        i0 = np.clip(np.searchsorted(a, x, side='right') - 1, 0, n - 2)
+        i1 = i0 + 1
+        w = (x - a[i0]) / (a[i1] - a[i0])
+
+    if descending:
+        i0, i1 = n - 1 - i0, n - 1 - i1
+    return i0, i1, w
+
+
+def area_weights(lat):
+    """
+    Relative surface area of the latitude band around each grid latitude.
+
+    Band edges are the midpoints between nodes, clipped to the poles, so the
+    weights follow cos(lat) in the interior and stay positive at the pole rows.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    if lat.size == 1:
+        return np.ones(1)
+    mid = (lat[1:] + lat[:-1]) / 2
+    edges = np.concatenate(([2 * lat[0] - mid[0]], mid, [2 * lat[-1] - mid[-1]]))
+    edges = np.radians(np.clip(edges, -90.0, 90.0))
+    return np.abs(np.diff(np.sin(edges)))
+
+
+def weighted_sum(terms):
+    """
+    Sum (weight, value) pairs of an interpolation stencil.
+
+    Corners with zero weight are dropped so that a NaN (fill value) neighbour
+    does not spoil a query that falls exactly on a valid grid node.
+    """
+    total = 0.0
+    for weight, value in terms:
+        total = total + np.where(weight > 0, weight * value, 0.0)
+    return total
+
+
+def read_block(variable, index, dtype=np.float64):
+    """Read a hyperslab and turn masked / fill values into NaN"""
+    data = variable[index]
+    if np.ma.isMaskedArray(data):
+        return data.astype(dtype).filled(np.nan)
+    return np.asarray(data, dtype=dtype)
+
+
+class ModelGrid:
+    """
+    Axes of one model variable, independent of its on-disk dimension order.
+
+    The processed files are stored as (depth, latitude, longitude) but the
+    column-major companions and some original files use other orders, so every
+    read goes through `index` and `to_depth_lat_lon`.
+    """
+
+    def __init__(self, ds, varname):
+        variable = ds.variables[varname]
+        if not is_model_variable(variable):
+            raise ValueError(f"'{varname}' is not a (depth, latitude, longitude) variable")
+
+        self.varname = varname
+        self.dimensions = variable.dimensions
+        self.depth_dim = _match(self.dimensions, DEPTH_NAMES)
+        self.lat_dim = _match(self.dimensions, LAT_NAMES)
+        self.lon_dim = _match(self.dimensions, LON_NAMES)
+
+        self.depth = np.asarray(ds.variables[self.depth_dim][:], dtype=np.float64)
+        self.lat = np.asarray(ds.variables[self.lat_dim][:], dtype=np.float64)
+        self.lon = np.asarray(ds.variables[self.lon_dim][:], dtype=np.float64)
+
+        # A global grid without a repeated end column needs to wrap across 0/360
+        self.lon_min = float(self.lon.min())
+        span = float(self.lon.max() - self.lon.min())
+        step = span / (self.lon.size - 1) if self.lon.size > 1 else 360.0
+        self.periodic = bool(span < 360.0 - 1e-6 and span + step >= 360.0 - 1e-6)
+
+        # Position of the depth, latitude and longitude axes in the variable
+        self.order = tuple(self.dimensions.index(d)
+                           for d in (self.depth_dim, self.lat_dim, self.lon_dim))
+
+    @property
+    def shape(self):
+        return (self.depth.size, self.lat.size, self.lon.size)
+
+    @property
+    def is_column_major(self):
+        """True if depth is the fastest varying dimension"""
+        return self.order[0] == 2
+
+    def index(self, depth=slice(None), lat=slice(None), lon=slice(None)):
+        """Build an index tuple in the variable's own dimension order"""
+        index = [None, None, None]
+        index[self.order[0]] = depth
+        index[self.order[1]] = lat
+        index[self.order[2]] = lon
+        return tuple(index)
+
+    def to_depth_lat_lon(self, block):
+        """Transpose a block read with `index` into (depth, latitude, longitude)"""
+        return np.transpose(block, self.order)
+
+    def read(self, variable, depth=slice(None), lat=slice(None), lon=slice(None),
+             dtype=np.float64):
+        """Read a hyperslab as a (depth, latitude, longitude) float array with NaN fills"""
+        return self.to_depth_lat_lon(read_block(variable, self.index(depth, lat, lon), dtype))
+
+    def bracket_lat(self, lat):
+        return bracket(self.lat, lat)
+
+    def bracket_lon(self, lon):
+        lon = normalize_lon(lon, self.lon_min)
+        return bracket(self.lon, lon, periodic=self.periodic)
+
+    def bracket_depth(self, depth):
+        return bracket(self.depth, depth)
+
+    def contains(self, depth, lat, lon):
+        """True for points inside the depth / latitude / longitude range of the grid"""
+        inside = ((depth >= self.depth.min()) & (depth <= self.depth.max())
+                  & (lat >= self.lat.min()) & (lat <= self.lat.max()))
+        if not self.periodic:
+            lon = normalize_lon(lon, self.lon_min)
+            inside &= lon <= self.lon.max()
+        return inside
+
+    def restrict_depth(self, stop):
+        """Copy of the grid keeping only the first `stop` depth nodes"""
+        grid = copy.copy(self)
+        grid.depth = self.depth[:stop]
+        return grid
+
+    def interpolate(self, values, depth, lat, lon):
+        """
+        Trilinear interpolation of an in-memory (depth, latitude, longitude) array
+        at arrays of points; points touching a NaN (fill) node come back as NaN
+        """
+        k0, k1, wz = self.bracket_depth(depth)
+        i0, i1, wy = self.bracket_lat(lat)
+        j0, j1, wx = self.bracket_lon(lon)
+        terms = []
+        for k, fz in ((k0, 1 - wz), (k1, wz)):
+            for i, fy in ((i0, 1 - wy), (i1, wy)):
+                for j, fx in ((j0, 1 - wx), (j1, wx)):
+                    terms.append((fz * fy * fx, values[k, i, j]))
+        return weighted_sum(terms)
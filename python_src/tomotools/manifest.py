@@ -0,0 +1,292 @@
+"""
+Verification of conversion outputs while they are written.
+
+The conversion scripts pass every write through an OutputVerifier, which checks
+and checksums the data it already has in memory:
+
+- coordinate variables must be strictly monotonic and free of NaN;
+- value ranges are recorded per variable and compared with a plausible range
+  (this also flags fill values that leaked into computed fields); values
+  outside it only warn, since real models can exceed it, e.g. water layers
+  with vs = 0 or depth nodes above sea level;
+- NaN and fill-value counts are recorded per variable, and layers without a
+  single valid value are listed (all-NaN layers fail, all-fill layers warn);
+- every written chunk gets a sha256 checksum of its stored bytes.
+
+The results are saved as <output>.manifest.json next to the output. A later
+`check_manifest` compares file size and modification time, and with deep=True
+re-hashes the chunks, without recomputing any statistics.
+
+Usage (from python_src):
+    python -m tomotools.manifest check ../processing_nc/*.nc [--deep]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from netCDF4 import Dataset, default_fillvals
+
+MANIFEST_SUFFIX = '.manifest.json'
+CHUNK_BYTES = 64 * 2**20
+
+# Plausible value ranges per output variable; values outside them are warnings
+EXPECTED_RANGES = {
+    'depth': (0.0, 6371.0),
+    'latitude': (-90.0, 90.0),
+    'longitude': (-180.0, 360.0),
+    'dVs(%)': (-50.0, 50.0),
+    'dVp(%)': (-50.0, 50.0),
+    'vs': (0.0, 15.0),
+    'vp': (0.0, 20.0),
+}
+
+
+def manifest_path(output_filename):
+    output_filename = Path(output_filename)
+    return output_filename.with_name(output_filename.name + MANIFEST_SUFFIX)
+
+
+def _fill_value(variable):
+    fill_value = getattr(variable, '_FillValue', None)
+    if fill_value is None:
+        fill_value = default_fillvals.get(variable.dtype.str[1:], None)
+    return fill_value
+
+
+def stored_bytes(data, variable):
+    """Bytes of `data` as netCDF stores them: masked values replaced by the fill value"""
+    data = np.ma.asarray(data)
+    fill_value = _fill_value(variable)
+    if fill_value is not None:
+        data = np.ma.filled(data.astype(variable.dtype), fill_value)
+    else:
+        data = np.asarray(data, dtype=variable.dtype)
+    return np.ascontiguousarray(data, dtype=variable.dtype.newbyteorder('<')).tobytes()
+
+
+def _chunk_rows(variable):
+    row_bytes = variable.dtype.itemsize * int(np.prod(variable.shape[1:], dtype=np.int64))
+    return max(1, CHUNK_BYTES // max(row_bytes, 1))
+
+
+class OutputVerifier:
+    """Check, count and checksum netCDF writes of one output file"""
+
+    def __init__(self, output_filename):
+        self.output = Path(output_filename)
+        self.variables = {}
+        self.chunks = {}
+
+    # ---------------------------- writes ----------------------------
+    def write(self, variable, data):
+        """Write a whole variable, in chunks along its first dimension"""
+        data = np.ma.asarray(data)
+        self.chunks[variable.name] = {}
+        self.variables.pop(variable.name, None)
+        if data.ndim == 0:
+            variable[:] = data
+            return
+        rows = _chunk_rows(variable)
+        for start in range(0, max(data.shape[0], 1), rows):
+            self.write_block(variable, start, data[start:start + rows])
+
+    def write_block(self, variable, start, data):
+        """Write data[...] to variable[start:start + len(data)] and record it"""
+        data = np.ma.asarray(data)
+        variable[start:start + data.shape[0]] = data
+        self.record(variable, start, data)
+
+    def record(self, variable, start, data):
+        """Statistics and checksum of one chunk that was written at `start`"""
+        values = np.ma.asarray(data)
+        mask = np.ma.getmaskarray(values)
+        fill_value = getattr(variable, '_FillValue', None)
+        raw = np.ma.getdata(values)
+        if fill_value is not None and np.issubdtype(raw.dtype, np.number):
+            mask = mask | (raw == fill_value)
+        raw = raw.astype(np.float64, copy=False) if np.issubdtype(raw.dtype, np.number) else None
+
+        entry = {
+            'start': int(start),
+            'rows': int(values.shape[0]),
+            'sha256': hashlib.sha256(stored_bytes(values, variable)).hexdigest(),
+        }
+        if raw is not None:
+            nan = np.isnan(raw) & ~mask
+            valid = ~(nan | mask)
+            entry['nan'] = int(nan.sum())
+            entry['fill'] = int(mask.sum())
+            entry['min'] = float(raw[valid].min()) if valid.any() else None
+            entry['max'] = float(raw[valid].max()) if valid.any() else None
+            entry['first'] = float(raw.flat[0]) if raw.size else None
+            entry['last'] = float(raw.flat[-1]) if raw.size else None
+            if raw.ndim >= 2:
+                axes = tuple(range(1, raw.ndim))
+                entry['empty_nan_rows'] = (np.flatnonzero(~valid.any(axis=axes) & nan.any(axis=axes))
+                                           + start).tolist()
+                entry['empty_fill_rows'] = (np.flatnonzero(~valid.any(axis=axes) & ~nan.any(axis=axes))
+                                            + start).tolist()
+            else:
+                entry['nonmonotonic'] = self._monotonic_breaks(raw)
+        self.chunks.setdefault(variable.name, {})[int(start)] = entry
+        self.variables[variable.name] = {
+            'dimensions': list(variable.dimensions),
+            'shape': list(variable.shape),
+            'dtype': variable.dtype.str,
+        }
+
+    @staticmethod
+    def _monotonic_breaks(raw):
+        if raw.size < 2:
+            return 0
+        step = np.diff(raw)
+        return int(min((step <= 0).sum(), (step >= 0).sum()))
+
+    # ---------------------------- summary ----------------------------
+    def summarize(self):
+        """Per-variable statistics plus (problems, warnings) lists"""
+        problems = []
+        warnings = []
+        summary = {}
+        for name, info in self.variables.items():
+            chunks = [self.chunks[name][key] for key in sorted(self.chunks[name])]
+            entry = dict(info)
+            entry['chunks'] = chunks
+            if 'nan' not in chunks[0]:
+                summary[name] = entry
+                continue
+
+            entry['nan'] = sum(c['nan'] for c in chunks)
+            entry['fill'] = sum(c['fill'] for c in chunks)
+            mins = [c['min'] for c in chunks if c['min'] is not None]
+            maxs = [c['max'] for c in chunks if c['max'] is not None]
+            entry['min'] = min(mins) if mins else None
+            entry['max'] = max(maxs) if maxs else None
+
+            is_coordinate = info['dimensions'] == [name]
+            if is_coordinate:
+                breaks = sum(c['nonmonotonic'] for c in chunks)
+                # Steps across chunk boundaries must follow the overall direction
+                increasing = chunks[-1]['last'] >= chunks[0]['first']
+                for prev, cur in zip(chunks, chunks[1:]):
+                    if (cur['first'] <= prev['last']) if increasing else (cur['first'] >= prev['last']):
+                        breaks += 1
+                entry['monotonic'] = breaks == 0
+                if breaks:
+                    problems.append(f"coordinate '{name}' is not strictly monotonic")
+                if entry['nan']:
+                    problems.append(f"coordinate '{name}' contains {entry['nan']} NaN values")
+            else:
+                empty_nan = sum((c.get('empty_nan_rows', []) for c in chunks), [])
+                empty_fill = sum((c.get('empty_fill_rows', []) for c in chunks), [])
+                entry['empty_nan_rows'] = empty_nan
+                entry['empty_fill_rows'] = empty_fill
+                if empty_nan:
+                    problems.append(f"'{name}' has all-NaN layers at index {empty_nan}")
+                if empty_fill:
+                    warnings.append(f"'{name}' has all-fill layers at index {empty_fill}")
+                if entry['nan']:
+                    warnings.append(f"'{name}' contains {entry['nan']} NaN values")
+
+            bounds = EXPECTED_RANGES.get(name)
+            if bounds is not None and entry['min'] is not None:
+                if entry['min'] < bounds[0] or entry['max'] > bounds[1]:
+                    warnings.append(f"'{name}' range [{entry['min']:g}, {entry['max']:g}] "
+                                    f"is outside [{bounds[0]:g}, {bounds[1]:g}]")
+            summary[name] = entry
+        return summary, problems, warnings
+
+    def finish(self):
+        """
+        Save the manifest once the output is closed; raise if a check failed.
+        Returns the manifest path.
+        """
+        summary, problems, warnings = self.summarize()
+        stat = self.output.stat()
+        manifest = {
+            'file': self.output.name,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'status': 'failed' if problems else 'ok',
+            'problems': problems,
+            'warnings': warnings,
+            'variables': summary,
+        }
+        path = manifest_path(self.output)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, path)
+
+        for message in warnings:
+            print(f"⚠️  {self.output.name}: {message}")
+        if problems:
+            raise RuntimeError(f"{self.output.name} failed verification:\n  " + "\n  ".join(problems))
+        return path
+
+
+def check_manifest(output_filename, deep=False):
+    """
+    Check an output against its manifest, return a list of problems (empty if intact).
+
+    The cheap check compares size and modification time; deep=True also re-hashes
+    every recorded chunk.
+    """
+    output_filename = Path(output_filename)
+    path = manifest_path(output_filename)
+    if not path.exists():
+        return [f"no manifest for {output_filename.name}"]
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    problems = []
+    if manifest['status'] != 'ok':
+        problems.append(f"conversion was recorded as {manifest['status']}: {manifest['problems']}")
+    stat = output_filename.stat()
+    if stat.st_size != manifest['size']:
+        problems.append(f"size changed: {stat.st_size} != {manifest['size']}")
+    elif stat.st_mtime_ns != manifest['mtime_ns'] and not deep:
+        problems.append("modified after the manifest was written (run a deep check)")
+
+    if deep:
+        with Dataset(output_filename, mode='r') as ds:
+            ds.set_auto_mask(False)
+            for name, info in manifest['variables'].items():
+                variable = ds.variables[name]
+                for chunk in info['chunks']:
+                    data = variable[chunk['start']:chunk['start'] + chunk['rows']]
+                    digest = hashlib.sha256(stored_bytes(data, variable)).hexdigest()
+                    if digest != chunk['sha256']:
+                        problems.append(f"'{name}' chunk at {chunk['start']} checksum mismatch")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conversion output manifests")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_check = sub.add_parser('check', help="check outputs against their manifests")
+    p_check.add_argument('outputs', nargs='+')
+    p_check.add_argument('--deep', action='store_true', help="re-hash every chunk")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for output in args.outputs:
+        problems = check_manifest(output, args.deep)
+        if problems:
+            failed = True
+            print(f"❌ {output}")
+            for problem in problems:
+                print(f"   {problem}")
+        else:
+            print(f"✅ {output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+netCDF output helpers: coordinate variables with the standard metadata used by the
+conversion scripts in python_src
+"""
+import numpy as np
+
+STANDARD_COORDINATE_ATTRS = {
+    'depth': {
+        'units': 'km',
+        'long_name': 'depth',
+        'standard_name': 'depth',
+        'axis': 'Z',
+        'positive': 'down',
+    },
+    'latitude': {
+        'units': 'degrees_north',
+        'long_name': 'latitude',
+        'standard_name': 'latitude',
+        'axis': 'Y',
+    },
+    'longitude': {
+        'units': 'degrees_east',
+        'long_name': 'longitude',
+        'standard_name': 'longitude',
+        'axis': 'X',
+    },
+}
+
+
+def copy_attributes(src_var, dst_var, skip=('_FillValue',)):
+    """Copy all netCDF attributes except the ones in `skip`"""
+    for attr_name in src_var.ncattrs():
+        if attr_name not in skip:
+            setattr(dst_var, attr_name, getattr(src_var, attr_name))
+
+
+def copy_global_attributes(src, dst):
+    for attr_name in src.ncattrs():
+        setattr(dst, attr_name, getattr(src, attr_name))
+
+
+def write_coordinate(dst, name, values, src_var=None):
+    """
+    Create a 1-D coordinate variable `name` on dimension `name`, copy the source
+    attributes and then apply the standard depth/latitude/longitude metadata.
+    """
+    dst.createDimension(name, len(values))
+    var = dst.createVariable(name, np.float32, (name,))
+    var[:] = values
+    if src_var is not None:
+        copy_attributes(src_var, var)
+    for attr_name, value in STANDARD_COORDINATE_ATTRS.get(name, {}).items():
+        setattr(var, attr_name, value)
+    return var
+
+
+def create_like(dst, name, src_var, dimensions, chunksizes=None):
+    """Create a float32 model variable carrying over the source _FillValue and attributes"""
+    fill_value = getattr(src_var, '_FillValue', None)
+    var = dst.createVariable(name, np.float32, dimensions, fill_value=fill_value,
+                             chunksizes=chunksizes)
+    copy_attributes(src_var, var)
+    return var
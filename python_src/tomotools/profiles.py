@@ -0,0 +1,214 @@
+"""
+Batched 1-D depth profile extraction.
+
+Profiles are bilinearly interpolated in latitude/longitude at every model depth.
+Columns are grouped into tiles of neighbouring grid cells and each tile is read
+with a single hyperslab, so thousands of stations cost a few hundred reads instead
+of one full-depth read per station and corner.
+
+With the (depth, latitude, longitude) layout each hyperslab still touches every
+depth slice; `write_column_major` builds a (latitude, longitude, depth) companion
+file in which a profile is one contiguous read.
+
+Usage (from python_src):
+    python -m tomotools.profiles extract ../processing_nc/glad-m35-dv.nc stations.txt --var 'dVs(%)'
+    python -m tomotools.profiles colmajor ../processing_nc/glad-m35-dv.nc
+    python -m tomotools.profiles bench ../processing_nc/glad-m35-dv.nc -n 2000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from netCDF4 import Dataset
+
+from .grid import ModelGrid, model_variables, pick_variable, weighted_sum
+from .ncio import copy_global_attributes, create_like, write_coordinate
+from .pyramid import select_level
+
+COLUMN_MAJOR_SUFFIX = '.colmajor.nc'
+TILE = 32            # grid cells per tile edge when grouping columns
+CHUNK = 8            # lat/lon chunk edge of the column-major companion
+BAND_BYTES = 256 * 2**20
+
+
+def column_major_path(path):
+    """Path of the column-major companion of a model file"""
+    path = Path(path)
+    return path.with_name(path.stem + COLUMN_MAJOR_SUFFIX)
+
+
+def extract_from_variable(variable, grid, lats, lons, tile=TILE):
+    """
+    Interpolate depth profiles under many (lat, lon) columns of an open variable.
+
+    Returns an array shaped (ncolumn, ndepth); fill values come back as NaN.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    if lats.shape != lons.shape:
+        raise ValueError("lats and lons must have the same length")
+
+    i0, i1, wy = grid.bracket_lat(lats)
+    j0, j1, wx = grid.bracket_lon(lons)
+    out = np.full((lats.size, grid.depth.size), np.nan)
+    if lats.size == 0:
+        return out
+
+    # Group columns by the tile of their lower-left cell
+    ntile_lon = grid.lon.size // tile + 1
+    keys = (np.minimum(i0, i1) // tile) * ntile_lon + np.minimum(j0, j1) // tile
+    order = np.argsort(keys, kind='stable')
+    splits = np.flatnonzero(np.diff(keys[order])) + 1
+
+    for cols in np.split(order, splits):
+        rows = np.union1d(i0[cols], i1[cols])
+        lon_cols = np.union1d(j0[cols], j1[cols])
+        if lon_cols[-1] - lon_cols[0] <= tile + 1:
+            lon_index = slice(int(lon_cols[0]), int(lon_cols[-1]) + 1)
+            b0 = j0[cols] - lon_cols[0]
+            b1 = j1[cols] - lon_cols[0]
+        else:
+            # The neighbourhood wraps across the longitude seam: read only the used columns
+            lon_index = lon_cols
+            b0 = np.searchsorted(lon_cols, j0[cols])
+            b1 = np.searchsorted(lon_cols, j1[cols])
+
+        block = grid.read(variable, lat=slice(int(rows[0]), int(rows[-1]) + 1), lon=lon_index)
+        a0 = i0[cols] - rows[0]
+        a1 = i1[cols] - rows[0]
+        y = wy[cols]
+        x = wx[cols]
+        out[cols] = weighted_sum((
+            ((1 - y) * (1 - x), block[:, a0, b0]),
+            ((1 - y) * x, block[:, a0, b1]),
+            (y * (1 - x), block[:, a1, b0]),
+            (y * x, block[:, a1, b1]),
+        )).T
+    return out
+
+
+def extract_profiles(path, lats, lons, varname=None, layout='auto', tile=TILE):
+    """
+    Extract depth profiles from a model file.
+
+    layout: 'auto' uses the column-major companion when it exists and is newer
+    than `path`, 'depth-major' always reads `path`, 'column-major' requires the
+    companion.
+
+    Returns (depth, profiles) with profiles shaped (ncolumn, ndepth).
+    """
+    path = Path(path)
+    companion = column_major_path(path)
+    if layout == 'column-major' or (layout == 'auto' and companion.exists()
+                                    and companion.stat().st_mtime >= path.stat().st_mtime):
+        path = companion
+    elif layout not in ('auto', 'depth-major'):
+        raise ValueError(f"Unknown layout: {layout}")
+
+    with Dataset(path, mode='r') as ds:
+        varname = pick_variable(ds, varname)
+        grid = ModelGrid(ds, varname)
+        return grid.depth, extract_from_variable(ds.variables[varname], grid, lats, lons, tile)
+
+
+def write_column_major(path, output=None, varnames=None, band_bytes=BAND_BYTES):
+    """
+    Write a (latitude, longitude, depth) copy of the model variables.
+
+    The source is transposed in latitude bands so memory stays bounded by
+    `band_bytes` regardless of the model size.
+    """
+    output = Path(output) if output is not None else column_major_path(path)
+    with Dataset(path, mode='r') as src, Dataset(output, mode='w') as dst:
+        names = varnames or model_variables(src)
+        grid = ModelGrid(src, pick_variable(src, names[0]))
+        ndepth, nlat, nlon = grid.shape
+
+        copy_global_attributes(src, dst)
+        write_coordinate(dst, 'latitude', grid.lat, src.variables[grid.lat_dim])
+        write_coordinate(dst, 'longitude', grid.lon, src.variables[grid.lon_dim])
+        write_coordinate(dst, 'depth', grid.depth, src.variables[grid.depth_dim])
+
+        chunks = (min(CHUNK, nlat), min(CHUNK, nlon), ndepth)
+        band = max(1, band_bytes // (4 * ndepth * nlon))
+        for name in names:
+            var_grid = ModelGrid(src, name)
+            dst_var = create_like(dst, name, src.variables[name],
+                                  ('latitude', 'longitude', 'depth'), chunksizes=chunks)
+            for start in range(0, nlat, band):
+                block = var_grid.read(src.variables[name], lat=slice(start, start + band),
+                                      dtype=np.float32)
+                dst_var[start:start + band] = np.ma.masked_invalid(np.transpose(block, (1, 2, 0)))
+    return output
+
+
+def benchmark(path, n=1000, varname=None, seed=0):
+    """Profiles per second for the depth-major file and its column-major companion"""
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(-90, 90, n)
+    lons = rng.uniform(-180, 180, n)
+
+    results = {}
+    for layout in ('depth-major', 'column-major'):
+        if layout == 'column-major' and not column_major_path(path).exists():
+            continue
+        start = time.perf_counter()
+        extract_profiles(path, lats, lons, varname, layout=layout)
+        results[layout] = n / (time.perf_counter() - start)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched depth profile extraction")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_extract = sub.add_parser('extract', help="profiles under the stations of a text file")
+    p_extract.add_argument('model')
+    p_extract.add_argument('stations', help="text file, first two columns: latitude longitude")
+    p_extract.add_argument('--var', default=None)
+    p_extract.add_argument('--layout', default='auto', choices=('auto', 'depth-major', 'column-major'))
+    p_extract.add_argument('--resolution', type=float, default=None,
+                           help="use the coarsest preview level finer than this (degrees)")
+    p_extract.add_argument('-o', '--output', default=None, help="output file (default: stdout)")
+
+    p_colmajor = sub.add_parser('colmajor', help="write the (latitude, longitude, depth) companion")
+    p_colmajor.add_argument('model')
+    p_colmajor.add_argument('-o', '--output', default=None)
+
+    p_bench = sub.add_parser('bench', help="profiles per second for both layouts")
+    p_bench.add_argument('model')
+    p_bench.add_argument('-n', type=int, default=1000)
+    p_bench.add_argument('--var', default=None)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'extract':
+        model = args.model
+        if args.resolution is not None:
+            model = select_level(model, args.resolution)
+        stations = np.loadtxt(args.stations, usecols=(0, 1), ndmin=2)
+        depth, profiles = extract_profiles(model, stations[:, 0], stations[:, 1],
+                                           args.var, layout=args.layout)
+        rows = np.column_stack((
+            np.repeat(stations, depth.size, axis=0),
+            np.tile(depth, len(stations)),
+            profiles.ravel(),
+        ))
+        np.savetxt(args.output or sys.stdout, rows, fmt='%.4f',
+                   header="latitude longitude depth value")
+    elif args.command == 'colmajor':
+        output = write_column_major(args.model, args.output)
+        print(f"✅ Wrote column-major file: {output}")
+    else:
+        results = benchmark(args.model, args.n, args.var)
+        for layout, rate in results.items():
+            print(f"{layout:>13}: {rate:10.1f} profiles/s")
+        if 'column-major' not in results:
+            print(f"No column-major companion yet, create it with: "
+                  f"python -m tomotools.profiles colmajor {args.model}")
+
+
+if __name__ == '__main__':
+    main()
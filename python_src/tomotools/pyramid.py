@@ -0,0 +1,186 @@
+"""
+Multi-resolution preview levels of a processed model.
+
+Each level is a separate netCDF file in a `preview/` directory next to the model,
+e.g. processing_nc/preview/glad-m35-dv.r1.nc, so ParaView can open it like any
+other output. A requested resolution is rounded to a whole number of grid cells
+and the file is named after the spacing actually written; levels that would not
+coarsen the native grid horizontally are skipped. Cells are averaged with
+latitude-band area weights; fill values are excluded from the average and a
+coarse cell without any valid input stays a fill value.
+
+Usage (from python_src):
+    python -m tomotools.pyramid build ../processing_nc/glad-m35-dv.nc
+    python -m tomotools.pyramid select ../processing_nc/glad-m35-dv.nc 1.0
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+from netCDF4 import Dataset, default_fillvals
+
+from .grid import ModelGrid, area_weights, model_variables, pick_variable
+from .ncio import copy_attributes, copy_global_attributes, write_coordinate
+
+PREVIEW_DIR = 'preview'
+# (horizontal resolution in degrees, number of depth layers averaged together)
+LEVELS = ((0.5, 1), (1.0, 2), (2.0, 4))
+BLOCK_BYTES = 256 * 2**20
+
+
+def level_path(path, resolution):
+    path = Path(path)
+    return path.parent / PREVIEW_DIR / f'{path.stem}.r{round(resolution, 3):g}.nc'
+
+
+def _step(axis):
+    return float(np.median(np.abs(np.diff(axis)))) if axis.size > 1 else 0.0
+
+
+def level_factors(grid, resolution):
+    """
+    (latitude, longitude) group sizes closest to `resolution` degrees and the
+    grid spacing they actually give
+    """
+    nlat, nlon = grid.lat.size, grid.lon.size
+    fy = max(1, int(round(resolution / _step(grid.lat)))) if nlat > 1 else 1
+    fx = max(1, int(round(resolution / _step(grid.lon)))) if nlon > 1 else 1
+    return fy, fx, max(fy * _step(grid.lat), fx * _step(grid.lon))
+
+
+def _coarsen_axis(axis, factor):
+    """Mean coordinate of every group of `factor` nodes (last group may be shorter)"""
+    return np.array([axis[i:i + factor].mean() for i in range(0, axis.size, factor)])
+
+
+def coarsen(block, lat_weights, factors):
+    """
+    Block-average a (depth, latitude, longitude) array with NaN fills.
+
+    `factors` is the (depth, latitude, longitude) group size; trailing partial
+    groups are averaged over the nodes they have.
+    """
+    fd, fy, fx = factors
+    nd, ny, nx = block.shape
+    pad = ((0, -nd % fd), (0, -ny % fy), (0, -nx % fx))
+    values = np.pad(block, pad, constant_values=np.nan)
+    weights = np.pad(lat_weights, pad[1])[None, :, None]
+
+    valid = ~np.isnan(values)
+    shape = (values.shape[0] // fd, fd, values.shape[1] // fy, fy, values.shape[2] // fx, fx)
+    num = np.where(valid, values * weights, 0.0).reshape(shape).sum(axis=(1, 3, 5))
+    den = np.where(valid, weights, 0.0).reshape(shape).sum(axis=(1, 3, 5))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, num / den, np.nan)
+
+
+def write_level(src, output, names, resolution, depth_stride, block_bytes=BLOCK_BYTES):
+    """Write one preview level of the variables `names` of an open Dataset"""
+    grid = ModelGrid(src, names[0])
+    ndepth, nlat, nlon = grid.shape
+    fy, fx, actual = level_factors(grid, resolution)
+    fd = max(1, int(depth_stride))
+    weights = area_weights(grid.lat)
+
+    output.parent.mkdir(exist_ok=True)
+    with Dataset(output, mode='w') as dst:
+        copy_global_attributes(src, dst)
+        dst.preview_source = Path(src.filepath()).name
+        dst.preview_resolution_deg = actual
+        dst.preview_depth_stride = fd
+
+        write_coordinate(dst, 'depth', _coarsen_axis(grid.depth, fd), src.variables[grid.depth_dim])
+        write_coordinate(dst, 'latitude', _coarsen_axis(grid.lat, fy), src.variables[grid.lat_dim])
+        write_coordinate(dst, 'longitude', _coarsen_axis(grid.lon, fx), src.variables[grid.lon_dim])
+
+        # Depth groups per read, keeping one block under block_bytes
+        groups = max(1, block_bytes // (8 * fd * nlat * nlon))
+        for name in names:
+            src_var = src.variables[name]
+            var_grid = ModelGrid(src, name)
+            fill_value = getattr(src_var, '_FillValue', default_fillvals['f4'])
+            dst_var = dst.createVariable(name, np.float32, ('depth', 'latitude', 'longitude'),
+                                         fill_value=fill_value, zlib=True)
+            copy_attributes(src_var, dst_var)
+            for start in range(0, ndepth, groups * fd):
+                block = var_grid.read(src_var, depth=slice(start, start + groups * fd))
+                coarse = coarsen(block, weights, (fd, fy, fx))
+                dst_var[start // fd:start // fd + coarse.shape[0]] = np.ma.masked_invalid(coarse)
+    return output
+
+
+def build_pyramid(path, levels=LEVELS, varnames=None):
+    """
+    Write every preview level that is horizontally coarser than the native grid,
+    return the written paths. Levels that round to the same grid keep the first.
+    """
+    written = {}
+    with Dataset(path, mode='r') as src:
+        names = varnames or model_variables(src)
+        grid = ModelGrid(src, pick_variable(src, names[0]))
+        for resolution, depth_stride in levels:
+            fy, fx, actual = level_factors(grid, resolution)
+            output = level_path(path, actual)
+            if fy == fx == 1 or output in written:
+                continue
+            written[output] = write_level(src, output, names, resolution, depth_stride)
+    return list(written.values())
+
+
+def list_levels(path):
+    """
+    (resolution in degrees, depth stride, path) of the native model and of its
+    existing preview levels, from finest to coarsest
+    """
+    path = Path(path)
+    with Dataset(path, mode='r') as ds:
+        grid = ModelGrid(ds, pick_variable(ds))
+        levels = [(max(_step(grid.lat), _step(grid.lon)), 1, path)]
+    for preview in sorted((path.parent / PREVIEW_DIR).glob(f'{path.stem}.r*.nc')):
+        with Dataset(preview, mode='r') as ds:
+            if getattr(ds, 'preview_source', None) == path.name:
+                levels.append((float(ds.preview_resolution_deg), int(ds.preview_depth_stride), preview))
+    return sorted(levels, key=lambda level: level[:2])
+
+
+def select_level(path, resolution):
+    """
+    Coarsest available level whose grid spacing is still at most `resolution`
+    degrees, with the finest depth sampling among levels of that spacing
+    """
+    levels = list_levels(path)
+    usable = [level for level in levels if level[0] <= resolution * 1.01] or levels[:1]
+    coarsest = max(level[0] for level in usable)
+    return min((level for level in usable if level[0] >= coarsest / 1.01),
+               key=lambda level: level[1])[2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-resolution preview levels")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_build = sub.add_parser('build', help="write the preview levels of one or more models")
+    p_build.add_argument('models', nargs='+')
+    p_build.add_argument('--levels', default=None,
+                         help="comma separated resolution:depth_stride pairs, e.g. 0.5:1,1:2,2:4")
+
+    p_select = sub.add_parser('select', help="print the coarsest level for a resolution in degrees")
+    p_select.add_argument('model')
+    p_select.add_argument('resolution', type=float)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        levels = LEVELS
+        if args.levels:
+            levels = tuple((float(res), int(stride)) for res, stride in
+                           (item.split(':') for item in args.levels.split(',')))
+        for model in args.models:
+            for output in build_pyramid(model, levels):
+                print(f"✅ Wrote preview level: {output}")
+    else:
+        print(select_level(args.model, args.resolution))
+
+
+if __name__ == '__main__':
+    main()
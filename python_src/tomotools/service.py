@@ -0,0 +1,358 @@
+"""
+Local query service keeping a set of models resident in memory.
+
+Every GetValues.out call re-opens and decodes its model; this daemon loads the
+models once and answers batched requests over localhost HTTP or a Unix socket.
+Request and response bodies are raw little-endian float64 arrays:
+
+    POST /point?model=NAME[&var=VAR]    body (n, 3) depth lat lon   -> (n,)
+    POST /profile?model=NAME[&var=VAR]  body (n, 2) lat lon         -> (n, ndepth)
+    POST /slice?model=NAME[&var=VAR]    body (n,) depths            -> (n, nlat, nlon)
+    GET  /models                        JSON description of the resident models
+    GET  /metrics                       JSON latency / throughput counters
+
+The response shape is given in the X-Shape header. Requests for the same model
+that arrive together are concatenated and evaluated in one vectorized call per
+(variable, kind), then split back to their callers.
+
+Usage (from python_src):
+    python -m tomotools.service ../processing_nc/glad-m35-dv.nc ../S40RTS_dvs.nc --port 8765
+    python -m tomotools.service ../processing_nc/*.nc --unix /tmp/tomo.sock
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+from netCDF4 import Dataset
+
+from .grid import ModelGrid, model_variables, pick_variable, weighted_sum
+
+MAX_BATCH_ROWS = 2**20
+WINDOW = 0.002      # seconds to wait for more requests before evaluating a batch
+KINDS = {'point': 3, 'profile': 2, 'slice': 1}   # float64 values per request row
+LISTEN_BACKLOG = socket.SOMAXCONN   # pending connections; the socketserver default of 5 refuses bursts
+
+
+class ResidentModel:
+    """All 3-D variables of one model file, loaded as (depth, latitude, longitude) float32"""
+
+    def __init__(self, path, varnames=None):
+        self.path = Path(path)
+        self.name = self.path.stem
+        with Dataset(self.path, mode='r') as ds:
+            names = varnames or model_variables(ds)
+            self.default_var = pick_variable(ds, names[0])
+            self.grid = ModelGrid(ds, self.default_var)
+            self.values = {}
+            for name in names:
+                var_grid = ModelGrid(ds, name)
+                self.values[name] = np.ascontiguousarray(
+                    var_grid.read(ds.variables[name], dtype=np.float32))
+
+    def describe(self):
+        return {
+            'path': str(self.path),
+            'variables': list(self.values),
+            'shape': list(self.grid.shape),
+            'depth': self.grid.depth.tolist(),
+        }
+
+    def evaluate(self, kind, varname, rows):
+        values = self.values[varname]
+        grid = self.grid
+        if kind == 'point':
+            return grid.interpolate(values, rows[:, 0], rows[:, 1], rows[:, 2])
+        if kind == 'profile':
+            i0, i1, wy = grid.bracket_lat(rows[:, 0])
+            j0, j1, wx = grid.bracket_lon(rows[:, 1])
+            return weighted_sum((
+                ((1 - wy) * (1 - wx), values[:, i0, j0]),
+                ((1 - wy) * wx, values[:, i0, j1]),
+                (wy * (1 - wx), values[:, i1, j0]),
+                (wy * wx, values[:, i1, j1]),
+            )).T
+        k0, k1, wz = grid.bracket_depth(rows[:, 0])
+        wz = wz[:, None, None]
+        return weighted_sum(((1 - wz, values[k0]), (wz, values[k1])))
+
+
+class Metrics:
+    """Thread-safe request counters and a window of recent latencies"""
+
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = defaultdict(lambda: {'requests': 0, 'rows': 0, 'batches': 0})
+        self.latencies = defaultdict(lambda: deque(maxlen=window))
+
+    def batch(self, key, nrequest, nrow):
+        with self.lock:
+            counter = self.counters[key]
+            counter['requests'] += nrequest
+            counter['rows'] += nrow
+            counter['batches'] += 1
+
+    def latency(self, key, seconds):
+        with self.lock:
+            self.latencies[key].append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            uptime = time.monotonic() - self.started
+            report = {'uptime_s': uptime, 'endpoints': {}}
+            for key, counter in self.counters.items():
+                lat = np.array(self.latencies[key]) * 1000
+                entry = dict(counter)
+                entry['rows_per_s'] = counter['rows'] / uptime
+                entry['requests_per_batch'] = counter['requests'] / max(counter['batches'], 1)
+                if lat.size:
+                    entry.update({f'latency_ms_p{p}': float(np.percentile(lat, p))
+                                  for p in (50, 95, 99)})
+                report['endpoints'][key] = entry
+            return report
+
+
+class Batcher:
+    """One worker thread per model coalescing queued requests into vectorized evaluations"""
+
+    def __init__(self, model, metrics, window=WINDOW):
+        self.model = model
+        self.metrics = metrics
+        self.window = window
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, name=f'batcher-{model.name}', daemon=True).start()
+
+    def submit(self, kind, varname, rows):
+        future = Future()
+        self.queue.put((kind, varname, rows, future))
+        return future
+
+    def _drain(self):
+        pending = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        nrow = len(pending[0][2])
+        while nrow < MAX_BATCH_ROWS:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            pending.append(item)
+            nrow += len(item[2])
+        return pending
+
+    def _run(self):
+        while True:
+            groups = defaultdict(list)
+            for kind, varname, rows, future in self._drain():
+                groups[(kind, varname)].append((rows, future))
+
+            for (kind, varname), items in groups.items():
+                try:
+                    rows = np.concatenate([rows for rows, _ in items])
+                    result = self.model.evaluate(kind, varname, rows)
+                except Exception as exc:
+                    for _, future in items:
+                        future.set_exception(exc)
+                    continue
+                self.metrics.batch(f'{self.model.name}/{kind}', len(items), len(rows))
+                start = 0
+                for part, future in items:
+                    future.set_result(result[start:start + len(part)])
+                    start += len(part)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    server_version = 'TomoQuery/1.0'
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, body, content_type='application/octet-stream', shape=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if shape is not None:
+            self.send_header('X-Shape', ','.join(str(n) for n in shape))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._reply(status, message.encode('utf-8'), content_type='text/plain; charset=utf-8')
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/models':
+            body = {name: batcher.model.describe() for name, batcher in self.server.batchers.items()}
+        elif path == '/metrics':
+            body = self.server.metrics.snapshot()
+        else:
+            return self._error(404, f"Unknown endpoint: {path}")
+        self._reply(200, json.dumps(body).encode('utf-8'), content_type='application/json')
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        kind = url.path.strip('/')
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if kind not in KINDS:
+            return self._error(404, f"Unknown endpoint: {url.path}")
+
+        batcher = self.server.batchers.get(query.get('model'))
+        if batcher is None:
+            return self._error(400, f"Unknown model: {query.get('model')}, "
+                                    f"available: {list(self.server.batchers)}")
+        varname = query.get('var', batcher.model.default_var)
+        if varname not in batcher.model.values:
+            return self._error(400, f"Unknown variable: {varname}")
+
+        length = int(self.headers.get('Content-Length', 0))
+        data = np.frombuffer(self.rfile.read(length), dtype='<f8')
+        if data.size % KINDS[kind]:
+            return self._error(400, f"/{kind} expects {KINDS[kind]} float64 values per row")
+
+        try:
+            result = batcher.submit(kind, varname, data.reshape(-1, KINDS[kind])).result()
+        except Exception as exc:
+            return self._error(500, f"{type(exc).__name__}: {exc}")
+        result = np.asarray(result, dtype='<f8')
+        self._reply(200, result.tobytes(), shape=result.shape)
+        self.server.metrics.latency(f'{batcher.model.name}/{kind}', time.perf_counter() - start)
+
+
+class TCPQueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+class UnixQueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+def make_server(models, host='127.0.0.1', port=8765, unix_socket=None, varnames=None,
+                window=WINDOW, verbose=False):
+    """Load the models and bind the HTTP server (call serve_forever() on the result)"""
+    metrics = Metrics()
+    batchers = {}
+    for path in models:
+        model = ResidentModel(path, varnames)
+        batchers[model.name] = Batcher(model, metrics, window)
+
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = UnixQueryServer(unix_socket, QueryHandler)
+    else:
+        server = TCPQueryServer((host, port), QueryHandler)
+    server.batchers = batchers
+    server.metrics = metrics
+    server.verbose = verbose
+    return server
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_path)
+
+
+class Client:
+    """Minimal client: Client(port=8765) or Client(unix_socket='/tmp/tomo.sock')"""
+
+    def __init__(self, host='127.0.0.1', port=8765, unix_socket=None, timeout=None):
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.unix_socket is not None:
+            return _UnixConnection(self.unix_socket, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=body)
+            response = conn.getresponse()
+            data = response.read()
+            if response.status != 200:
+                raise RuntimeError(data.decode('utf-8', 'replace'))
+            return response, data
+        finally:
+            conn.close()
+
+    def query(self, kind, model, rows, var=None):
+        rows = np.ascontiguousarray(rows, dtype='<f8')
+        params = {'model': model}
+        if var:
+            params['var'] = var
+        path = f'/{kind}?{urlencode(params)}'
+        response, data = self._request('POST', path, rows.tobytes())
+        shape = tuple(int(n) for n in response.getheader('X-Shape').split(',') if n)
+        return np.frombuffer(data, dtype='<f8').reshape(shape)
+
+    def points(self, model, depth, lat, lon, var=None):
+        return self.query('point', model, np.column_stack((depth, lat, lon)), var)
+
+    def profiles(self, model, lat, lon, var=None):
+        return self.query('profile', model, np.column_stack((lat, lon)), var)
+
+    def slices(self, model, depths, var=None):
+        return self.query('slice', model, np.atleast_1d(depths), var)
+
+    def models(self):
+        return json.loads(self._request('GET', '/models')[1])
+
+    def metrics(self):
+        return json.loads(self._request('GET', '/metrics')[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resident-model query service")
+    parser.add_argument('models', nargs='+')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--vars', nargs='+', default=None, help="variables to load (default: all)")
+    parser.add_argument('--window-ms', type=float, default=WINDOW * 1000,
+                        help="time to collect concurrent requests into one batch")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    server = make_server(args.models, args.host, args.port, args.unix, args.vars,
+                         args.window_ms / 1000, args.verbose)
+    where = args.unix or f'http://{args.host}:{args.port}'
+    print(f"✅ Serving {', '.join(server.batchers)} on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+if __name__ == '__main__':
+    main()
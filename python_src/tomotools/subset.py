@@ -0,0 +1,178 @@
+"""
+Regional subsets of many models with hyperslab-only reads.
+
+A latitude/longitude box and depth range is translated into at most two
+contiguous hyperslabs per variable (two when the box crosses the longitude seam
+of the model, e.g. 170° ~ -170° on a -180 ~ 180 grid or 350° ~ 10° on a 0 ~ 360
+grid). Box longitudes may be given in either convention; the box always runs
+east from its first to its second longitude. Output longitudes increase
+monotonically and use -180 ~ 180 unless the box needs values above 180 to stay
+monotonic across the dateline.
+
+Usage (from python_src):
+    python -m tomotools.subset --lat -30 10 --lon 160 -150 --depth 0 800 \\
+        -o ../regional ../processing_nc/*.nc
+"""
+import argparse
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from netCDF4 import Dataset
+
+from .grid import ModelGrid, model_variables, normalize_lon, pick_variable
+from .ncio import copy_global_attributes, create_like, write_coordinate
+
+BLOCK_BYTES = 256 * 2**20
+
+SubsetPlan = namedtuple('SubsetPlan', 'depth lat lon_slices depth_values lat_values lon_values')
+
+
+def _range_slice(axis, lo, hi):
+    """Contiguous slice of the nodes of a monotonic axis within [lo, hi]"""
+    lo, hi = min(lo, hi), max(lo, hi)
+    inside = np.flatnonzero((axis >= lo) & (axis <= hi))
+    if inside.size == 0:
+        raise ValueError(f"No grid nodes between {lo} and {hi}")
+    return slice(int(inside[0]), int(inside[-1]) + 1)
+
+
+def plan_subset(grid, lat_range, lon_range, depth_range=None):
+    """Hyperslabs and output coordinates of a box on a model grid"""
+    if grid.lon.size > 1 and np.any(np.diff(grid.lon) <= 0):
+        raise ValueError("Longitudes must be increasing")
+
+    depth = slice(None) if depth_range is None else _range_slice(grid.depth, *depth_range)
+    lat = _range_slice(grid.lat, *lat_range)
+
+    west, east = lon_range
+    width = np.mod(east - west, 360.0)
+    if width == 0 and east != west:
+        width = 360.0
+    start = float(normalize_lon(west, grid.lon_min))
+    stop = start + width
+
+    first = np.flatnonzero((grid.lon >= start) & (grid.lon <= stop))
+    lon_slices = []
+    lon_values = []
+    if first.size:
+        lon_slices.append(slice(int(first[0]), int(first[-1]) + 1))
+        lon_values.append(grid.lon[lon_slices[-1]])
+    if stop > grid.lon_min + 360.0:
+        # The box continues past the seam: wrapped nodes, skipping a repeated end column
+        last = lon_values[-1][-1] if lon_values else -np.inf
+        wrapped = grid.lon + 360.0
+        second = np.flatnonzero((wrapped <= stop) & (wrapped > last))
+        if second.size:
+            lon_slices.append(slice(int(second[0]), int(second[-1]) + 1))
+            lon_values.append(wrapped[lon_slices[-1]])
+    if not lon_slices:
+        raise ValueError(f"No grid nodes between longitudes {west} and {east}")
+
+    lon_values = np.concatenate(lon_values)
+    if lon_values[0] >= 180.0:
+        lon_values = lon_values - 360.0
+    elif lon_values[0] < -180.0:
+        lon_values = lon_values + 360.0
+    return SubsetPlan(depth, lat, lon_slices, grid.depth[depth], grid.lat[lat], lon_values)
+
+
+def read_subset(variable, grid, plan, rows=None):
+    """
+    Read the box of one variable as (depth, latitude, longitude); `rows`
+    optionally selects a range of depths counted from the top of the box
+    """
+    depth = plan.depth
+    if rows is not None:
+        offset = plan.depth.start or 0
+        depth = slice(offset + rows.start, offset + rows.stop)
+    pieces = [grid.read(variable, depth=depth, lat=plan.lat, lon=lon, dtype=np.float32)
+              for lon in plan.lon_slices]
+    return np.concatenate(pieces, axis=2)
+
+
+def subset_model(path, output, lat_range, lon_range, depth_range=None, varnames=None,
+                 block_bytes=BLOCK_BYTES):
+    """Write the regional subset of one model file, return the output path"""
+    output = Path(output)
+    with Dataset(path, mode='r') as src:
+        names = varnames or model_variables(src)
+        grid = ModelGrid(src, pick_variable(src, names[0]))
+        plan = plan_subset(grid, lat_range, lon_range, depth_range)
+        ndepth, nlat, nlon = (plan.depth_values.size, plan.lat_values.size, plan.lon_values.size)
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with Dataset(output, mode='w') as dst:
+            copy_global_attributes(src, dst)
+            dst.subset_source = Path(path).name
+            dst.subset_bbox = (f"lat {lat_range[0]:g} ~ {lat_range[1]:g}, "
+                               f"lon {lon_range[0]:g} ~ {lon_range[1]:g}")
+            if depth_range is not None:
+                dst.subset_depth_range = f"{depth_range[0]:g} ~ {depth_range[1]:g} km"
+
+            write_coordinate(dst, 'depth', plan.depth_values, src.variables[grid.depth_dim])
+            write_coordinate(dst, 'latitude', plan.lat_values, src.variables[grid.lat_dim])
+            write_coordinate(dst, 'longitude', plan.lon_values, src.variables[grid.lon_dim])
+
+            rows = max(1, block_bytes // (4 * nlat * nlon))
+            for name in names:
+                var_grid = ModelGrid(src, name)
+                dst_var = create_like(dst, name, src.variables[name],
+                                      ('depth', 'latitude', 'longitude'))
+                dst_var.coordinates = "depth latitude longitude"
+                for start in range(0, ndepth, rows):
+                    block = read_subset(src.variables[name], var_grid, plan,
+                                        slice(start, min(start + rows, ndepth)))
+                    dst_var[start:start + block.shape[0]] = np.ma.masked_invalid(block)
+    return output
+
+
+def subset_models(models, output_dir, lat_range, lon_range, depth_range=None, varnames=None,
+                  suffix='subset', workers=None):
+    """
+    Subset many models in parallel processes. A model that fails does not stop
+    the others.
+
+    Returns ([output paths], {model path: error message}).
+    """
+    output_dir = Path(output_dir)
+    outputs, failures = [], {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {str(model): pool.submit(subset_model, model,
+                                           output_dir / f'{Path(model).stem}_{suffix}.nc',
+                                           lat_range, lon_range, depth_range, varnames)
+                   for model in models}
+        for model, future in futures.items():
+            try:
+                outputs.append(future.result())
+            except Exception as exc:
+                failures[model] = f"{type(exc).__name__}: {exc}"
+    return outputs, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regional lat/lon/depth subsets of models")
+    parser.add_argument('models', nargs='+')
+    parser.add_argument('--lat', nargs=2, type=float, required=True, metavar=('SOUTH', 'NORTH'))
+    parser.add_argument('--lon', nargs=2, type=float, required=True, metavar=('WEST', 'EAST'),
+                        help="the box runs east from WEST to EAST, either longitude convention")
+    parser.add_argument('--depth', nargs=2, type=float, default=None, metavar=('TOP', 'BOTTOM'))
+    parser.add_argument('--vars', nargs='+', default=None)
+    parser.add_argument('--suffix', default='subset', help="output name: <model>_<suffix>.nc")
+    parser.add_argument('-o', '--output-dir', default='.')
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    outputs, failures = subset_models(args.models, args.output_dir, args.lat, args.lon, args.depth,
+                                      args.vars, args.suffix, args.jobs)
+    for output in outputs:
+        print(f"✅ Wrote regional subset: {output}")
+    for model, message in failures.items():
+        print(f"❌ {model}: {message}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
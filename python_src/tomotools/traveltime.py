@@ -0,0 +1,279 @@
+"""
+Batched travel-time perturbations along great-circle ray paths.
+
+Vectorized counterparts of FindAz, GcpDistance and WayPoint from
+src/CPP-Library-Headers (as used by src/utils/CrossSection.cpp) place every ray
+in the great-circle plane of its source and receiver. Two simple ray geometries
+are supported:
+
+- turning depth: a circular arc through source, receiver and the turning point
+  halfway along the path;
+- path segments: piecewise-linear depth nodes at given fractions of the epicentral
+  distance, shared by all paths of a batch.
+
+All samples of all paths are interpolated in one pass per model and the delay is
+integrated as dt = -sum(ds * (dV%/100) / v_ref(depth)), i.e. to first order in
+the slowness perturbation. Models are evaluated in parallel processes.
+
+Any model with a perturbation field works: the processed files store dVs(%) /
+dVp(%), the top-level *_dvs.nc / *_dvp.nc files store it as "v". v_ref is the
+depth mean of vs / vp when the file has them; files without an absolute
+velocity (all top-level dv files) need a --reference depth/velocity table.
+
+Usage (from python_src):
+    python -m tomotools.traveltime paths.txt ../processing_nc/glad-m35-dv.nc ../S40RTS_dvs.nc \\
+        --phase S --reference prem_vs.txt -j 4
+"""
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from netCDF4 import Dataset
+
+from .grid import ModelGrid, model_variables
+
+EARTH_RADIUS = 6371.0
+NSAMPLE = 200
+CHUNK_POINTS = 2**21
+PERTURBATION_NAMES = {'S': ('dVs(%)', 'dvs'), 'P': ('dVp(%)', 'dvp')}
+# Top-level files keep their field in "v"; the file name tells what it is
+FILE_SUFFIXES = {'S': '_dvs', 'P': '_dvp'}
+ABSOLUTE_NAMES = {'S': ('vs',), 'P': ('vp',)}
+
+
+# ---------------------------- great-circle geometry ----------------------------
+def gcp_distance(lon1, lat1, lon2, lat2):
+    """Great-circle distance in degrees"""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    h = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0))))
+
+
+def find_az(lon1, lat1, lon2, lat2):
+    """Azimuth (degrees clockwise from north, 0 ~ 360) from point 1 to point 2"""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    az = np.arctan2(np.sin(lon2 - lon1) * np.cos(lat2),
+                    np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1))
+    return np.mod(np.degrees(az), 360.0)
+
+
+def way_point(lon, lat, az, dist):
+    """(lon, lat) reached after travelling `dist` degrees along azimuth `az`"""
+    lon, lat, az, dist = map(np.radians, (lon, lat, az, dist))
+    lat2 = np.arcsin(np.clip(np.sin(lat) * np.cos(dist)
+                             + np.cos(lat) * np.sin(dist) * np.cos(az), -1.0, 1.0))
+    lon2 = lon + np.arctan2(np.sin(az) * np.sin(dist) * np.cos(lat),
+                            np.cos(dist) - np.sin(lat) * np.sin(lat2))
+    return np.degrees(lon2), np.degrees(lat2)
+
+
+# ---------------------------- ray geometries ----------------------------
+def arc_nodes(delta, turning_depth, nsample=NSAMPLE):
+    """
+    Nodes of circular-arc rays in their great-circle plane.
+
+    delta: epicentral distances (degrees), turning_depth: km, both shaped (npath,).
+    Returns (theta, radius), each (npath, nsample + 1): angular distance from the
+    source in degrees and radius in km.
+    """
+    half = np.radians(np.asarray(delta, dtype=np.float64))[:, None] / 2
+    a = EARTH_RADIUS * np.sin(half)            # half chord
+    b = EARTH_RADIUS * np.cos(half)            # chord height above the centre
+    c = EARTH_RADIUS - np.asarray(turning_depth, dtype=np.float64)[:, None]
+    # A straight chord has an infinite circle radius: nudge it onto a very flat arc
+    c = np.where(np.abs(c - b) < 1e-3, b + 1e-3, c)
+
+    yc = (c ** 2 - EARTH_RADIUS ** 2) / (2 * (c - b))   # arc centre on the symmetry axis
+    rho = np.abs(c - yc)
+    sign = np.sign(c - yc)
+    phi = np.arctan2(a, sign * (b - yc))
+
+    t = np.linspace(-1.0, 1.0, nsample + 1)[None, :] * phi
+    x = rho * np.sin(t)
+    y = yc + sign * rho * np.cos(t)
+    theta = np.degrees(np.arctan2(x, y) + half)
+    return theta, np.hypot(x, y)
+
+
+def segment_nodes(delta, fractions, depths, nsample=NSAMPLE):
+    """
+    Nodes of piecewise-linear rays.
+
+    fractions: (nnode,) increasing fractions of the epicentral distance from 0 to 1,
+    depths: (npath, nnode) depths in km at those fractions.
+    """
+    fractions = np.asarray(fractions, dtype=np.float64)
+    depths = np.atleast_2d(np.asarray(depths, dtype=np.float64))
+    f = np.linspace(0.0, 1.0, nsample + 1)
+    k = np.clip(np.searchsorted(fractions, f, side='right') - 1, 0, fractions.size - 2)
+    w = (f - fractions[k]) / (fractions[k + 1] - fractions[k])
+    depth = (1 - w) * depths[:, k] + w * depths[:, k + 1]
+    theta = np.asarray(delta, dtype=np.float64)[:, None] * f[None, :]
+    return theta, EARTH_RADIUS - depth
+
+
+def sample_paths(src_lat, src_lon, rcv_lat, rcv_lon, turning_depth=None,
+                 fractions=None, depths=None, nsample=NSAMPLE):
+    """
+    Midpoint samples of a batch of rays.
+
+    Give either `turning_depth` (npath,) or `fractions` and `depths` for the
+    segment geometry. Returns (lat, lon, depth, ds), each (npath, nsample), with
+    ds the length in km represented by each sample.
+    """
+    src_lat, src_lon, rcv_lat, rcv_lon = (np.atleast_1d(np.asarray(x, dtype=np.float64))
+                                          for x in (src_lat, src_lon, rcv_lat, rcv_lon))
+    delta = gcp_distance(src_lon, src_lat, rcv_lon, rcv_lat)
+    az = find_az(src_lon, src_lat, rcv_lon, rcv_lat)
+
+    if turning_depth is not None:
+        theta, radius = arc_nodes(delta, turning_depth, nsample)
+    elif fractions is not None and depths is not None:
+        theta, radius = segment_nodes(delta, fractions, depths, nsample)
+    else:
+        raise ValueError("Give either turning_depth or fractions and depths")
+
+    x = radius * np.sin(np.radians(theta))
+    y = radius * np.cos(np.radians(theta))
+    ds = np.hypot(np.diff(x, axis=1), np.diff(y, axis=1))
+
+    theta_mid = (theta[:, 1:] + theta[:, :-1]) / 2
+    depth_mid = EARTH_RADIUS - (radius[:, 1:] + radius[:, :-1]) / 2
+    lon, lat = way_point(src_lon[:, None], src_lat[:, None], az[:, None], theta_mid)
+    return lat, lon, depth_mid, ds
+
+
+# ---------------------------- integration ----------------------------
+def _find(ds, candidates):
+    names = model_variables(ds)
+    for name in candidates:
+        if name in names:
+            return name
+    return None
+
+
+def _perturbation(ds, path, phase):
+    """Name of the dV% variable of a phase, including "v" in the top-level *_dvs / *_dvp files"""
+    candidates = PERTURBATION_NAMES[phase]
+    if Path(path).stem.lower().endswith(FILE_SUFFIXES[phase]):
+        candidates = candidates + ('v',)
+    return _find(ds, candidates)
+
+
+def _reference(ds, phase, grid, stop, reference):
+    """Reference velocity (km/s) at the first `stop` model depths"""
+    if reference is not None:
+        ref_depth, ref_velocity = (np.asarray(x, dtype=np.float64) for x in reference)
+        order = np.argsort(ref_depth)
+        return np.interp(grid.depth[:stop], ref_depth[order], ref_velocity[order])
+    absolute = _find(ds, ABSOLUTE_NAMES[phase])
+    if absolute is None:
+        raise ValueError(f"'{ds.filepath()}' has no absolute {phase} velocity ({'/'.join(ABSOLUTE_NAMES[phase])}), "
+                         "a --reference depth/velocity table is required")
+    abs_grid = ModelGrid(ds, absolute)
+    values = abs_grid.read(ds.variables[absolute], depth=slice(0, stop), dtype=np.float32)
+    return np.nanmean(values, axis=(1, 2))
+
+
+def integrate_model(path, lat, lon, depth, ds, phase='S', varname=None, reference=None):
+    """
+    Delay times (s) of a sampled batch through one model.
+
+    Returns (delay, coverage) per path, coverage being the fraction of the path
+    length with valid model values. Samples outside the depth / latitude /
+    longitude range of the model or on fill values contribute nothing to the delay.
+    """
+    with Dataset(path, mode='r') as nc:
+        varname = varname or _perturbation(nc, path, phase)
+        if varname is None:
+            raise ValueError(f"No {phase} perturbation variable in '{path}'")
+        grid = ModelGrid(nc, varname)
+
+        # Only read the depth range the rays reach
+        stop = grid.depth.size
+        if grid.depth[0] < grid.depth[-1]:
+            stop = min(int(np.searchsorted(grid.depth, np.nanmax(depth), side='right')) + 1, stop)
+        grid = grid.restrict_depth(stop)
+        values = grid.read(nc.variables[varname], depth=slice(0, stop), dtype=np.float32)
+        v_ref = _reference(nc, phase, grid, stop, reference)
+
+    flat = [np.ravel(x) for x in (lat, lon, depth)]
+    dv = np.empty(flat[0].size)
+    for start in range(0, dv.size, CHUNK_POINTS):
+        part = slice(start, start + CHUNK_POINTS)
+        dv[part] = grid.interpolate(values, flat[2][part], flat[0][part], flat[1][part])
+    # Interpolation clamps to the edge nodes: samples outside the model are missing
+    dv[~grid.contains(flat[2], flat[0], flat[1])] = np.nan
+    dv = dv.reshape(np.shape(lat))
+
+    # np.interp needs increasing depths; the model axis may be descending
+    order = np.argsort(grid.depth)
+    slowness = 1.0 / np.interp(depth, grid.depth[order], v_ref[order])
+    valid = ~np.isnan(dv)
+    delay = -np.sum(np.where(valid, ds * dv / 100 * slowness, 0.0), axis=1)
+    coverage = np.sum(np.where(valid, ds, 0.0), axis=1) / np.sum(ds, axis=1)
+    return delay, coverage
+
+
+def score_models(models, samples, phase='S', varname=None, reference=None, workers=None):
+    """
+    Integrate one sampled batch through many models in parallel. A model that
+    fails does not stop the others.
+
+    Returns ({model path: (delay, coverage)}, {model path: error message}).
+    """
+    models = [str(model) for model in models]
+    results, failures = {}, {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {model: pool.submit(integrate_model, model, *samples, phase=phase,
+                                      varname=varname, reference=reference)
+                   for model in models}
+        for model, future in futures.items():
+            try:
+                results[model] = future.result()
+            except Exception as exc:
+                failures[model] = f"{type(exc).__name__}: {exc}"
+    return results, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Travel-time perturbations along great-circle rays")
+    parser.add_argument('paths', help="text file: src_lat src_lon rcv_lat rcv_lon turning_depth(km)")
+    parser.add_argument('models', nargs='+')
+    parser.add_argument('--phase', default='S', choices=('S', 'P'))
+    parser.add_argument('--var', default=None,
+                        help="perturbation variable in %% for all models (default: by phase and file name)")
+    parser.add_argument('--reference', default=None,
+                        help="text file: depth(km) velocity(km/s); default: depth mean of vs/vp in the model, "
+                             "required for models without vs/vp such as the top-level *_dvs.nc / *_dvp.nc")
+    parser.add_argument('--nsample', type=int, default=NSAMPLE)
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    parser.add_argument('-o', '--output', default=None, help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    rays = np.loadtxt(args.paths, usecols=(0, 1, 2, 3, 4), ndmin=2)
+    reference = None
+    if args.reference:
+        table = np.loadtxt(args.reference, usecols=(0, 1), ndmin=2)
+        reference = (table[:, 0], table[:, 1])
+
+    samples = sample_paths(rays[:, 0], rays[:, 1], rays[:, 2], rays[:, 3],
+                           turning_depth=rays[:, 4], nsample=args.nsample)
+    results, failures = score_models(args.models, samples, args.phase, args.var, reference, args.jobs)
+
+    scored = [model for model in args.models if str(model) in results]
+    if scored:
+        delays = np.column_stack([rays] + [results[str(model)][0] for model in scored])
+        header = "src_lat src_lon rcv_lat rcv_lon turning_depth " + " ".join(
+            f"dt[{Path(model).stem}]" for model in scored)
+        np.savetxt(args.output or sys.stdout, delays, fmt='%.4f', header=header)
+    for model, message in failures.items():
+        print(f"❌ {model}: {message}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Export models to VTK structured grids (.vts) in Earth-centred Cartesian coordinates.
+
+Points are placed at radius = 6371 - depth (km) and written, together with every
+model variable, as raw little-endian Float32 arrays in the appended section of
+the XML file. Points and values are produced one depth slab at a time, so memory
+use is bounded by `SLAB_BYTES` whatever the model size. Fill values become NaN.
+
+Usage (from python_src):
+    python -m tomotools.vtk_export ../processing_nc/glad-m35-dv.nc
+    python -m tomotools.vtk_export ../processing_nc/*.nc ../*.nc -o ../vtk
+"""
+import argparse
+import os
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+from netCDF4 import Dataset
+
+from .grid import ModelGrid, model_variables, pick_variable
+
+EARTH_RADIUS = 6371.0
+SLAB_BYTES = 64 * 2**20
+HEADER_BYTES = 8  # UInt64 block size header in front of each appended array
+
+
+def unit_sphere(lat, lon):
+    """(nlat, nlon, 3) Cartesian unit vectors of a latitude/longitude grid"""
+    lat = np.radians(lat)[:, None]
+    lon = np.radians(lon)[None, :]
+    return np.stack((np.cos(lat) * np.cos(lon),
+                     np.cos(lat) * np.sin(lon),
+                     np.broadcast_to(np.sin(lat), (lat.size, lon.size))), axis=-1)
+
+
+def _header(extent, names, npoints):
+    """XML header and the appended-data offsets of every array"""
+    offsets = []
+    offset = 0
+    for ncomponent in [1] * len(names) + [3]:
+        offsets.append(offset)
+        offset += HEADER_BYTES + 4 * ncomponent * npoints
+
+    arrays = '\n'.join(
+        f'        <DataArray type="Float32" Name={quoteattr(name)} format="appended" offset="{off}"/>'
+        for name, off in zip(names, offsets))
+    scalars = f' Scalars={quoteattr(names[0])}' if names else ''
+    return (
+        '<?xml version="1.0"?>\n'
+        '<VTKFile type="StructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+        f'  <StructuredGrid WholeExtent="{extent}">\n'
+        f'    <Piece Extent="{extent}">\n'
+        f'      <PointData{scalars}>\n'
+        f'{arrays}\n'
+        '      </PointData>\n'
+        '      <Points>\n'
+        f'        <DataArray type="Float32" NumberOfComponents="3" format="appended" offset="{offsets[-1]}"/>\n'
+        '      </Points>\n'
+        '    </Piece>\n'
+        '  </StructuredGrid>\n'
+        '  <AppendedData encoding="raw">\n'
+        '   _'
+    )
+
+
+def export_vts(path, output=None, varnames=None, slab_bytes=SLAB_BYTES, close_seam=True):
+    """
+    Write a model file as a .vts structured grid, return the output path.
+
+    Grid index i runs over longitude, j over latitude and k over depth. With
+    `close_seam` a global grid gets its first longitude repeated at the end so
+    the sphere has no gap at the dateline.
+    """
+    path = Path(path)
+    output = Path(output) if output is not None else path.with_suffix('.vts')
+    if output.is_dir():
+        output = output / (path.stem + '.vts')
+
+    with Dataset(path, mode='r') as src:
+        names = varnames or model_variables(src)
+        grid = ModelGrid(src, pick_variable(src, names[0]))
+        grids = [ModelGrid(src, name) for name in names]
+
+        lon_index = np.arange(grid.lon.size)
+        if close_seam and grid.periodic:
+            lon_index = np.append(lon_index, 0)
+        ndepth, nlat, nlon = grid.depth.size, grid.lat.size, lon_index.size
+        npoints = ndepth * nlat * nlon
+
+        unit = unit_sphere(grid.lat, grid.lon[lon_index])
+        radius = EARTH_RADIUS - grid.depth
+        slab = max(1, slab_bytes // (12 * nlat * nlon))
+        extent = f'0 {nlon - 1} 0 {nlat - 1} 0 {ndepth - 1}'
+
+        with open(output, 'wb') as f:
+            f.write(_header(extent, names, npoints).encode('ascii'))
+
+            for name, var_grid in zip(names, grids):
+                f.write(np.uint64(4 * npoints).astype('<u8').tobytes())
+                for start in range(0, ndepth, slab):
+                    values = var_grid.read(src.variables[name], depth=slice(start, start + slab),
+                                           dtype=np.float32)
+                    f.write(values[:, :, lon_index].astype('<f4').tobytes())
+
+            f.write(np.uint64(12 * npoints).astype('<u8').tobytes())
+            for start in range(0, ndepth, slab):
+                points = radius[start:start + slab, None, None, None] * unit[None]
+                f.write(points.astype('<f4').tobytes())
+
+            f.write(b'\n  </AppendedData>\n</VTKFile>\n')
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export models to binary VTK structured grids")
+    parser.add_argument('models', nargs='+')
+    parser.add_argument('-o', '--output', default=None,
+                        help="output file (single model) or directory, created for several models or a "
+                             "trailing separator (default: next to the model)")
+    parser.add_argument('--vars', nargs='+', default=None, help="variables to export (default: all)")
+    parser.add_argument('--open-seam', action='store_true',
+                        help="do not repeat the first longitude at the end of global grids")
+    args = parser.parse_args(argv)
+
+    output = args.output
+    if output is not None and (len(args.models) > 1 or output.endswith(('/', os.sep))):
+        if os.path.exists(output) and not os.path.isdir(output):
+            parser.error(f"-o {output} is a file; {len(args.models)} models need an output directory")
+        os.makedirs(output, exist_ok=True)
+
+    for model in args.models:
+        written = export_vts(model, output, args.vars, close_seam=not args.open_seam)
+        print(f"✅ Wrote VTK structured grid: {written}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 """
 Run all Python scripts with one click
 """
+import argparse
 import subprocess
 import sys
 from pathlib import Path
@@ -21,6 +22,22 @@ def ensure_directories_exist():
         directory.mkdir(exist_ok=True)
         print(f"✓ Ensured directory exists: {directory}")
 
+def build_previews():
+    """Write the multi-resolution preview levels of every processed model"""
+    project_root = Path(__file__).parent.absolute()
+    python_src_dir = project_root / "python_src"
+    nc_files = [f for f in sorted((project_root / "processing_nc").glob("*.nc"))
+                if ".colmajor" not in f.name]
+
+    for nc_file in nc_files:
+        print(f"\n🗺  Building previews: {nc_file.name}")
+        result = subprocess.run([sys.executable, "-m", "tomotools.pyramid", "build", str(nc_file)],
+                                cwd=str(python_src_dir),
+                                capture_output=False,
+                                text=True)
+        if result.returncode != 0:
+            print(f"❌ Previews of {nc_file.name} failed")
+
 def run_all_scripts():
     """Run all Python scripts in python_src directory"""
     project_root = Path(__file__).parent.absolute()
@@ -68,4 +85,11 @@ def run_all_scripts():
             print(f"❌ Error running {py_file.name}: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run all conversion scripts")
+    parser.add_argument("--pyramid", action="store_true",
+                        help="also write downsampled preview levels to processing_nc/preview")
+    args = parser.parse_args()
+
     run_all_scripts()
+    if args.pyramid:
+        build_previews()